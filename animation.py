@@ -0,0 +1,107 @@
+import random
+import time
+
+# -------------------------------
+# Title animation (lookup table + one frame scheduler)
+# -------------------------------
+FRAME_INTERVAL = 30     # ms between frames while a round is running
+IDLE_INTERVAL = 100     # ms between frames while idle
+
+
+def rgb_to_hex(r, g, b):
+    return f'#{int(r):02x}{int(g):02x}{int(b):02x}'
+
+
+def gradient_lut(colors, steps):
+    """Precompute the hex colors of a smooth loop through `colors`, `steps` + 1 frames per pair."""
+    lut = []
+    for i, c1 in enumerate(colors):
+        c2 = colors[(i + 1) % len(colors)]
+        for step in range(steps + 1):
+            t = step / steps
+            lut.append(rgb_to_hex(*(a + (b - a) * t for a, b in zip(c1, c2))))
+    return lut
+
+
+class TitleAnimation:
+    """Cycles the title through a color gradient and jitters its shadow.
+    Both are driven by elapsed time, so a lower frame rate keeps the same speed, and the
+    canvas is only touched when the color or shadow position actually changes.
+    """
+
+    def __init__(self, canvas, text_item, shadow_item, colors, steps=25, color_period=0.03,
+                 jitter_period=0.1, origin=(350, 50), jitter=3, shadow_offset=2):
+        self.canvas = canvas
+        self.text_item = text_item
+        self.shadow_item = shadow_item
+        self.lut = gradient_lut(colors, steps)
+        self.color_period = color_period
+        self.jitter_period = jitter_period
+        self.origin = origin
+        self.jitter = jitter
+        self.shadow_offset = shadow_offset
+        self._color = None
+        self._jitter_tick = None
+
+    def frame(self, elapsed):
+        color = self.lut[int(elapsed / self.color_period) % len(self.lut)]
+        if color != self._color:
+            self._color = color
+            self.canvas.itemconfig(self.text_item, fill=color)
+        tick = int(elapsed / self.jitter_period)
+        if tick != self._jitter_tick:
+            self._jitter_tick = tick
+            x = self.origin[0] + random.randint(-self.jitter, self.jitter) + self.shadow_offset
+            y = self.origin[1] + random.randint(-self.jitter, self.jitter) + self.shadow_offset
+            self.canvas.coords(self.shadow_item, x, y)
+
+
+class FrameScheduler:
+    """Runs every canvas animation from a single root.after chain.
+    Frames come every `interval` ms, or `idle_interval` ms while is_idle() returns True,
+    and stop completely while the window is minimized or hidden.
+    """
+
+    def __init__(self, root, interval=FRAME_INTERVAL, idle_interval=IDLE_INTERVAL, is_idle=None):
+        self.root = root
+        self.interval = interval
+        self.idle_interval = idle_interval
+        self.is_idle = is_idle or (lambda: False)
+        self.animations = []
+        self._start = time.monotonic()
+        self._after_id = None
+        root.bind("<Map>", self._on_map, add="+")
+        root.bind("<Unmap>", self._on_unmap, add="+")
+
+    def add(self, animation):
+        self.animations.append(animation)
+
+    def start(self):
+        if self._after_id is None:
+            self._after_id = self.root.after_idle(self._frame)
+
+    def stop(self):
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _visible(self):
+        return self.root.state() != "iconic" and self.root.winfo_viewable()
+
+    def _on_map(self, event):
+        if event.widget is self.root:
+            self.start()
+
+    def _on_unmap(self, event):
+        if event.widget is self.root:
+            self.stop()
+
+    def _frame(self):
+        self._after_id = None
+        if not self._visible():
+            # Resumed by the <Map> event
+            return
+        elapsed = time.monotonic() - self._start
+        for animation in self.animations:
+            animation.frame(elapsed)
+        self._after_id = self.root.after(self.idle_interval if self.is_idle() else self.interval, self._frame)
@@ -0,0 +1,659 @@
+"""Headless benchmarks for the game's hot paths, run against local stand-ins.
+
+    python bench.py                  # all benchmarks
+    python bench.py --rounds 20000   # more replayed rounds
+    python bench.py --only rounds    # rounds, pipeline, haptics, bluesky, stream, windows,
+                                     # sessions, session_posts, history
+    python bench.py --json           # machine-readable output
+
+rounds   replays rounds on virtual time with a simulated player, window list and feed:
+         pick->detect, window->detect lag, countdown->verdict of Bluesky post rounds,
+         CPU per round.
+pipeline plays a round sequence on virtual time, with and without prefetching the next
+         task: time spent in pick (round setup), prefetch time per round.
+haptics  plays rounds whose vibration goes through DeviceFleet to a local Buttplug
+         websocket server: window detection->stop acked by every device.
+bluesky  verifies posts against a local XRPC server: post->verdict.
+stream   verifies posts pushed by a local Jetstream server, with one forced reconnect:
+         post->verdict.
+windows  opens real X11 windows and times their detection through the X11 provider
+         (needs python-xlib and a display, e.g. xvfb-run python bench.py --only windows).
+sessions runs many websocket players against one server.py process at once:
+         pick->label round trip, rounds per second, server CPU per round.
+session_posts  many websocket players verifying Bluesky posts on one account through the
+         server's shared feed poller and request limits: post->verdict.
+history  appends rounds to a round history file and times the queries over all of them.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+from catalog import TaskCatalog
+from sim import (XWindowMaker, FakeButtplugServer, FakeJetstreamServer, FakeXRPCServer, StaticTasks, VirtualFeed,
+                 headless_game)
+
+
+def percentiles(samples, scale=1.0):
+    if not samples:
+        return {"n": 0}
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(len(ordered) * q))] * scale
+    return {"n": len(ordered), "p50": pick(0.5), "p90": pick(0.9), "p99": pick(0.99),
+            "max": ordered[-1] * scale, "mean": sum(ordered) / len(ordered) * scale}
+
+
+# -------------------------------
+# Round replay (virtual time)
+# -------------------------------
+def bench_rounds(rounds, seed=1):
+    from game import POST_COUNTDOWN
+
+    rng = random.Random(seed)
+    tasks = StaticTasks(TaskCatalog.from_entries([
+        {"type": "open_link", "name": f"Task {i}", "duration": 5 + i % 20,
+         "link": f"https://example.invalid/{i}", "window_title": f"Sim Window {i}", "weight": 1 + i % 3}
+        for i in range(50)
+    ] + [
+        {"type": "bluesky_post", "name": f"Post {i}", "duration": 0, "post_text": f"simon says post {i:02d}"}
+        for i in range(10)
+    ]))
+    game, scheduler, windows = headless_game(tasks, seed=seed)
+    game.bluesky = feed = VirtualFeed(scheduler)
+    marks = {}
+    game.listeners.append(lambda event, **fields: marks.setdefault(event, scheduler.now))
+
+    pick_to_detect, window_to_detect, countdown_to_verdict, cpu = [], [], [], []
+    outcomes = {"success": 0, "fail": 0}
+    for _ in range(rounds):
+        marks.clear()
+        started = time.perf_counter()
+        game.pick_task()
+        task = game.current_task
+        reaction = rng.uniform(0.2, 2.5)
+        opened_at = []
+
+        def player_open():
+            if task["type"] == "bluesky_post":
+                if rng.random() < 0.9:
+                    # Posts somewhere around the end of the countdown; 1 in 10 never does
+                    feed.post(task["post_text"], rng.uniform(0.5, POST_COUNTDOWN + 8))
+                game.open_task()
+                return
+            windows.open(task["window_title"])
+            opened_at.append(scheduler.now)
+            game.open_task()
+            if rng.random() < 0.1:
+                # Gives up half way through the countdown
+                scheduler.call_later(reaction + task["duration"] / 2, windows.close, task["window_title"])
+
+        if task["simon"] or rng.random() < 0.2:
+            scheduler.call_later(reaction, player_open)
+        else:
+            scheduler.call_later(reaction, game.do_nothing_task)
+        scheduler.run(stop=lambda: "verdict" in marks and game.ui.buttons == "normal")
+        cpu.append(time.perf_counter() - started)
+
+        if "detect" in marks:
+            pick_to_detect.append(marks["detect"] - marks["pick"])
+            if opened_at:
+                window_to_detect.append(marks["detect"] - opened_at[0])
+        if task["type"] == "bluesky_post" and "countdown" in marks:
+            countdown_to_verdict.append(marks["verdict"] - marks["countdown"])
+        outcomes["fail" if "penalty_done" in marks else "success"] += 1
+        windows.titles.clear()
+        feed.posts.clear()
+        scheduler.run(until=scheduler.now + 1.0)
+
+    return {
+        "rounds": rounds,
+        "outcomes": outcomes,
+        "window_enumerations_per_round": windows.enumerations / rounds,
+        "pick_to_detect_s": percentiles(pick_to_detect),
+        "window_to_detect_s": percentiles(window_to_detect),
+        "countdown_to_verdict_s": percentiles(countdown_to_verdict),
+        "cpu_per_round_ms": percentiles(cpu, 1000),
+    }
+
+
+# -------------------------------
+# Round sequence with and without prefetching (virtual time)
+# -------------------------------
+def bench_pipeline(rounds, tasks=500, seed=1):
+    import waveforms
+    from prefetch import Prefetcher
+
+    catalog = TaskCatalog.from_entries([
+        {"type": "open_link", "name": f"Task {i}", "duration": 2, "window_title": f"Sim Window {i}",
+         "link": f"https://host{i}.example.invalid/",
+         "waveforms": {
+             "start": {"shape": "pulse", "low": 10, "high": 30 + i % 60, "period": 0.5, "duration": 20 + i % 7},
+             "penalty": {"shape": "escalate", "from": 40, "to": 100, "steps": 3 + i % 5, "duration": 10},
+         }}
+        for i in range(tasks)
+    ])
+
+    def run(prefetch):
+        waveforms._compiled.clear()
+        game, scheduler, windows = headless_game(StaticTasks(catalog), seed=seed)
+        resolved, prefetches = [], []
+        if prefetch:
+            prefetcher = Prefetcher(game.windows, resolve=lambda host, *args, **kwargs: resolved.append(host))
+
+            def timed_prefetch(task, current):
+                started = time.perf_counter()
+                prefetcher(task, current)
+                prefetches.append(time.perf_counter() - started)
+
+            game.prefetch = timed_prefetch
+            # As on the worker thread: prefetching is its own job, after the round is set up
+            game.spawn = lambda target, *args: scheduler.call_soon(target, *args)
+        picks = []
+        pick_task = game.pick_task
+
+        def timed_pick():
+            started = time.perf_counter()
+            pick_task()
+            picks.append(time.perf_counter() - started)
+
+        def open_window(task):
+            windows.open(task["window_title"])
+            game.open_task()
+
+        def player(event, task=None, **fields):
+            if event == "pick" and task["simon"]:
+                scheduler.call_later(0.5, open_window, task)
+            elif event == "pick":
+                scheduler.call_later(0.5, game.do_nothing_task)
+            elif event == "verdict":
+                windows.titles.clear()
+
+        game.pick_task = timed_pick
+        game.listeners.append(player)
+        game.start_sequence(gap=1)
+        scheduler.run(stop=lambda: len(picks) >= rounds)
+        game.stop_sequence()
+        return picks, prefetches, len(resolved)
+
+    cold, _, _ = run(False)
+    warm, prefetches, resolved = run(True)
+    return {
+        "rounds": rounds,
+        "pick_ms": percentiles(cold, 1000),
+        "pick_prefetched_ms": percentiles(warm, 1000),
+        "prefetch_ms": percentiles(prefetches, 1000),
+        "links_resolved_ahead": resolved,
+    }
+
+
+# -------------------------------
+# Haptic path (local Buttplug server, real time)
+# -------------------------------
+def bench_haptics(detections, devices=2, ack_delay=0.002, spacing=0.12, seed=1):
+    from buttplug.client import Client
+    from buttplug.connectors import WebsocketConnector
+    from haptics import ButtplugLink, DeviceFleet
+
+    server = FakeButtplugServer(ack_delay=ack_delay).start()
+    for i in range(devices):
+        server.add_device(f"Sim Vibe {i}", actuators=1 + i % 2)
+
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    fleet = DeviceFleet(loop, dict)
+    link = ButtplugLink(fleet, lambda: Client("SimonSaysBench"), WebsocketConnector, server.url)
+    running = asyncio.run_coroutine_threadsafe(link.run(), loop)
+    end = time.monotonic() + 10
+    while len(fleet.queues) < devices and time.monotonic() < end:
+        time.sleep(0.01)
+
+    # Every device notes when it acked a stop sent after the detection
+    detected, stopped, all_stopped = [], {}, threading.Event()
+
+    def timed(queue):
+        send = queue.send
+
+        async def _send(command, value=None):
+            await send(command, value)
+            if command == "stop" and detected:
+                stopped.setdefault(queue.name, time.monotonic())
+                if len(stopped) == len(names):
+                    all_stopped.set()
+        queue.send = _send
+
+    for _, queue in list(fleet.queues.values()):
+        timed(queue)
+    names = {queue.name for _, queue in fleet.queues.values()}
+
+    def output(level):
+        # As main.output_level(), with the fleet always there
+        if level:
+            fleet.submit("vibrate", level / 100.0)
+        else:
+            fleet.submit("stop")
+
+    # Rounds on virtual time (the game side), vibration in real time (the device side)
+    tasks = StaticTasks(TaskCatalog.from_entries([
+        {"type": "open_link", "name": f"Task {i}", "duration": 1, "link": f"https://example.invalid/{i}",
+         "window_title": f"Sim Window {i}"}
+        for i in range(20)
+    ]))
+    game, scheduler, windows = headless_game(tasks, output=output, seed=seed)
+    rng = random.Random(seed)
+    game.listeners.append(lambda event, **fields: event == "detect" and detected.append(time.monotonic()))
+
+    latencies, missed = [], 0
+    for _ in range(detections):
+        detected.clear()
+        stopped.clear()
+        all_stopped.clear()
+        game.pick_task()
+        task = game.current_task
+        # The start cue plays for a while (real time, longer than the devices' command spacing)
+        # before the player's window shows up
+        scheduler.run(until=scheduler.now + 0.1)
+        time.sleep(spacing)
+        scheduler.call_later(rng.uniform(0.1, 0.9), windows.open, task["window_title"])
+        scheduler.run(stop=lambda: bool(detected))
+        if all_stopped.wait(1.0):
+            latencies.append(max(stopped.values()) - detected[0])
+        else:
+            missed += 1
+        scheduler.run(stop=lambda: not game.task_active and game.ui.buttons == "normal")
+        windows.titles.clear()
+        scheduler.run(until=scheduler.now + 1.0)
+
+    failed = 0
+    connected = len(fleet.queues)
+    for _, queue in list(fleet.queues.values()):
+        failed += queue.metrics.failed
+    # Stop the link before the server so it does not start reconnecting
+    loop.call_soon_threadsafe(running.cancel)
+    time.sleep(0.1)
+    server.stop()
+    return {
+        "detections": detections,
+        "devices": connected,
+        "failed": failed,
+        "missed": missed,
+        "server_commands": len(server.commands),
+        "detect_to_ack_ms": percentiles(latencies, 1000),
+    }
+
+
+# -------------------------------
+# Bluesky verification (local XRPC server, real time)
+# -------------------------------
+def bench_bluesky(posts, interval=0.05):
+    import bluesky
+    import endpoints
+
+    server = FakeXRPCServer().start()
+    # Point the lookups at the stand-in and keep the real endpoint stats untouched
+    bluesky.FEED_CANDIDATES[:] = [f"{server.base_url}/xrpc/app.bsky.feed.getAuthorFeed"]
+    endpoints.scoreboard.path = os.path.join(tempfile.mkdtemp(), "endpoint_stats.json")
+    endpoints.scoreboard.load()
+    endpoints.rate_limiter.rate = endpoints.rate_limiter.capacity = 1000
+
+    latencies, missed = [], 0
+    for i in range(posts):
+        for n in range(5):
+            server.add_post(f"noise {i}.{n}")
+        text = f"simon says post {i}"
+        since, started = time.time(), time.monotonic()
+        delay = random.uniform(0.0, 0.2)
+        timer = threading.Timer(delay, server.add_post, args=(text,))
+        timer.start()
+        found = bluesky.watch_for_post(server.did, text, since, time.monotonic() + 5, lambda: True,
+                                       interval=interval)
+        done = time.monotonic()
+        timer.join()
+        if found:
+            latencies.append(done - (started + delay))
+        else:
+            missed += 1
+    requests = server.requests
+    server.stop()
+    return {
+        "posts": posts,
+        "missed": missed,
+        "requests_per_post": requests / posts,
+        "post_to_verdict_ms": percentiles(latencies, 1000),
+    }
+
+
+def bench_stream(posts):
+    import jetstream
+
+    server = FakeJetstreamServer().start()
+    did = "did:plc:simonsays"
+    jetstream.RECONNECT_MIN = 0.05
+    stream = jetstream.PostStream(lambda: did, url=server.url).start()
+    verifier = jetstream.StreamVerifier(stream)
+    end = time.monotonic() + 5
+    while not stream.live and time.monotonic() < end:
+        time.sleep(0.01)
+
+    latencies, missed = [], 0
+    for i in range(posts):
+        if i == posts // 2:
+            # The post lands while the subscription is down and comes back with the resume cursor
+            server.drop_connections()
+        for n in range(5):
+            server.add_post(f"did:plc:other{n}", f"noise {i}.{n}")
+        text = f"simon says post {i}"
+        since, started = time.time(), time.monotonic()
+        delay = random.uniform(0.0, 0.2)
+        timer = threading.Timer(delay, server.add_post, args=(did, text))
+        timer.start()
+        found = verifier.watch_for_post(did, text, since, time.monotonic() + 5, lambda: True)
+        done = time.monotonic()
+        timer.join()
+        if found:
+            latencies.append(done - (started + delay))
+        else:
+            missed += 1
+    server.stop()
+    return {
+        "posts": posts,
+        "missed": missed,
+        "connections": server.connections,
+        "post_to_verdict_ms": percentiles(latencies, 1000),
+    }
+
+
+# -------------------------------
+# X11 window detection (real display, real time)
+# -------------------------------
+def bench_windows(detections, spacing=0.02):
+    from windows import WindowWatcher
+    from x11windows import X11Provider
+
+    if not os.environ.get("DISPLAY"):
+        raise ImportError("no DISPLAY (run under xvfb-run)")
+    maker = XWindowMaker()
+    watcher = WindowWatcher(X11Provider())
+    latencies, missed = [], 0
+    for i in range(detections):
+        title = f"Sim Window {i} - Browser"
+        seen = threading.Event()
+        handle = watcher.subscribe(f"sim window {i} ", lambda _pattern, present: present and seen.set())
+        opened = time.monotonic()
+        maker.open(title)
+        if seen.wait(2.0):
+            latencies.append(time.monotonic() - opened)
+        else:
+            missed += 1
+        maker.close(title)
+        watcher.unsubscribe(handle)
+        time.sleep(spacing)
+    return {
+        "detections": detections,
+        "missed": missed,
+        "open_to_detect_ms": percentiles(latencies, 1000),
+    }
+
+
+# -------------------------------
+# Multi-session server (local websocket players, real time)
+# -------------------------------
+def _start_session_server(tasks):
+    from server import SessionServer
+
+    server = SessionServer(tasks, port=0)
+    started = threading.Event()
+
+    def _serve():
+        asyncio.set_event_loop(server.loop)
+        server.loop.run_until_complete(server.start())
+        started.set()
+        server.loop.run_forever()
+
+    thread = threading.Thread(target=_serve, name="sessions", daemon=True)
+    thread.start()
+    started.wait()
+    return server, thread
+
+
+def _stop_session_server(server, thread):
+    asyncio.run_coroutine_threadsafe(server.stop(), server.loop).result(10)
+    server.loop.call_soon_threadsafe(server.loop.stop)
+    thread.join(5)
+
+
+def bench_sessions(sessions, rounds=3, duration=1):
+    import websockets
+
+    tasks = StaticTasks(TaskCatalog.from_entries([
+        {"type": "open_link", "name": f"Sim Task {i}", "duration": duration,
+         "link": f"https://example.invalid/{i}", "window_title": f"Sim Task {i}"}
+        for i in range(20)
+    ]))
+    server, thread = _start_session_server(tasks)
+
+    round_trips, verdicts = [], {"success": 0, "fail": 0}
+
+    async def player(n):
+        rng = random.Random(n)
+        async with websockets.connect(f"ws://127.0.0.1:{server.port}", max_queue=None) as ws:
+            await ws.send(json.dumps({"type": "hello", "name": f"player {n}"}))
+            for _ in range(rounds):
+                sent = time.monotonic()
+                await ws.send(json.dumps({"type": "pick"}))
+                label = None
+                while True:
+                    message = json.loads(await ws.recv())
+                    if message["type"] == "show" and label is None:
+                        label = message["text"]
+                        round_trips.append(time.monotonic() - sent)
+                        break
+                await asyncio.sleep(rng.uniform(0.05, 0.3))
+                if label.startswith("Simon says: ") or rng.random() < 0.2:
+                    name = label.split("Simon says: ")[-1].rsplit(" (", 1)[0]
+                    await ws.send(json.dumps({"type": "open"}))
+                    await ws.send(json.dumps({"type": "windows", "titles": [name, "Desktop"]}))
+                else:
+                    await ws.send(json.dumps({"type": "nothing"}))
+                while True:
+                    message = json.loads(await ws.recv())
+                    if message["type"] == "verdict":
+                        verdicts["success" if message["success"] else "fail"] += 1
+                    if message["type"] == "buttons" and message["state"] == "normal":
+                        break
+                await ws.send(json.dumps({"type": "windows", "titles": ["Desktop"]}))
+
+    async def players():
+        await asyncio.gather(*(player(n) for n in range(sessions)))
+
+    cpu, wall = time.process_time(), time.monotonic()
+    asyncio.run(players())
+    wall, cpu = time.monotonic() - wall, time.process_time() - cpu
+    _stop_session_server(server, thread)
+    finished = sum(verdicts.values())
+    return {
+        "sessions": sessions,
+        "rounds": finished,
+        "outcomes": verdicts,
+        "rounds_per_second": round(finished / wall, 1),
+        # Players and server share this process, so this is an upper bound for the server
+        "cpu_per_round_ms": round(cpu / max(1, finished) * 1000, 3),
+        "pick_to_label_ms": percentiles(round_trips, 1000),
+    }
+
+
+# -------------------------------
+# Round history (append rate, query time over the whole log)
+# -------------------------------
+def bench_history(rounds, tasks=200, seed=1):
+    import history
+
+    rng = random.Random(seed)
+    names = [f"Task {i}" for i in range(tasks)]
+    skill = [rng.uniform(0.3, 0.95) for _ in range(tasks)]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "round_history.bin")
+        log = history.RoundLog(path)
+        started_at = time.time() - rounds * 30
+        append = time.perf_counter()
+        for n in range(rounds):
+            i = rng.randrange(tasks)
+            reaction = rng.lognormvariate(0, 0.5) if rng.random() < 0.9 else None
+            log.append(names[i], rng.random() < skill[i], started_at + n * 30, reaction=reaction,
+                       duration=rng.uniform(1, 30), simon=rng.random() < 0.5, action="window",
+                       endpoint="public.api.bsky.app" if i % 10 == 0 else None)
+        append = time.perf_counter() - append
+        log.close()
+
+        history._numpy()    # keep the numpy import out of the timings
+        timings = {}
+        opened = time.perf_counter()
+        store = history.RoundHistory(path)
+        store.columns()
+        timings["open_ms"] = time.perf_counter() - opened
+        for name, query in (("success_rates_ms", store.success_rates),
+                            ("reaction_percentiles_ms", store.reaction_percentiles),
+                            ("streaks_ms", store.streaks)):
+            started = time.perf_counter()
+            query()
+            timings[name] = time.perf_counter() - started
+        size = os.path.getsize(path)
+        store.close()
+    return {
+        "rounds": rounds,
+        "numpy": history._numpy() is not None,
+        "file_bytes": size,
+        "append_us_per_round": round(append / rounds * 1e6, 2),
+        **{name: round(seconds * 1000, 2) for name, seconds in timings.items()},
+    }
+
+
+def bench_session_posts(sessions, rounds=2):
+    """Every player gets Bluesky post tasks on one account served by a local XRPC server,
+    with the server's own request limits: post->verdict for all sessions at once.
+    """
+    import bluesky
+    import endpoints
+    import websockets
+
+    xrpc = FakeXRPCServer().start()
+    bluesky.FEED_CANDIDATES[:] = [f"{xrpc.base_url}/xrpc/app.bsky.feed.getAuthorFeed"]
+    endpoints.scoreboard.path = os.path.join(tempfile.mkdtemp(), "endpoint_stats.json")
+    endpoints.scoreboard.load()
+    tasks = StaticTasks(TaskCatalog.from_entries([
+        # Zero-padded, so no post text is contained in another (matching is by substring)
+        {"type": "bluesky_post", "name": f"Sim Post {i:02d}", "duration": 0,
+         "post_text": f"simon says sim post {i:02d}", "bluesky_did": xrpc.did}
+        for i in range(20)
+    ]))
+    server, thread = _start_session_server(tasks)
+    latencies, verdicts = [], {"success": 0, "fail": 0}
+
+    async def player(n):
+        rng = random.Random(n)
+        loop = asyncio.get_running_loop()
+        async with websockets.connect(f"ws://127.0.0.1:{server.port}", max_queue=None) as ws:
+            await ws.send(json.dumps({"type": "hello", "name": f"player {n}"}))
+            for _ in range(rounds):
+                await ws.send(json.dumps({"type": "pick"}))
+                while True:
+                    message = json.loads(await ws.recv())
+                    if message["type"] == "show":
+                        label = message["text"]
+                        break
+                posted = None
+                if label.startswith("Simon says: "):
+                    await ws.send(json.dumps({"type": "open"}))
+                    await asyncio.sleep(rng.uniform(0.2, 1.0))
+                    number = label.split("Sim Post ")[1].split(" ")[0]
+                    await loop.run_in_executor(None, xrpc.add_post, f"Simon says sim post {number}")
+                    posted = time.monotonic()
+                else:
+                    await ws.send(json.dumps({"type": "nothing"}))
+                judged = False
+                while True:
+                    message = json.loads(await ws.recv())
+                    if message["type"] == "verdict":
+                        judged = True
+                        verdicts["success" if message["success"] else "fail"] += 1
+                        if posted is not None and message["success"]:
+                            latencies.append(time.monotonic() - posted)
+                    # Post tasks leave the buttons enabled from the pick on
+                    if judged and message["type"] == "buttons" and message["state"] == "normal":
+                        break
+
+    async def players():
+        await asyncio.gather(*(player(n) for n in range(sessions)))
+
+    asyncio.run(players())
+    polls = server.feeds.polls
+    _stop_session_server(server, thread)
+    requests = xrpc.requests
+    xrpc.stop()
+    return {
+        "sessions": sessions,
+        "outcomes": verdicts,
+        "feed_polls": polls,
+        "feed_requests": requests,
+        "post_to_verdict_s": percentiles(latencies),
+    }
+
+
+def _print(name, result):
+    print(f"== {name}")
+    for key, value in result.items():
+        if isinstance(value, dict) and "n" in value:
+            if value["n"]:
+                print(f"  {key:32} n={value['n']:<6} p50={value['p50']:.3f} p90={value['p90']:.3f} "
+                      f"p99={value['p99']:.3f} max={value['max']:.3f}")
+            else:
+                print(f"  {key:32} no samples")
+        else:
+            print(f"  {key:32} {value}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simon Says headless benchmarks")
+    parser.add_argument("--rounds", type=int, default=5000, help="rounds to replay")
+    parser.add_argument("--detections", type=int, default=200, help="detections to time in the haptics benchmark")
+    parser.add_argument("--posts", type=int, default=50, help="Bluesky posts to verify")
+    parser.add_argument("--sessions", type=int, default=200, help="concurrent players for the server")
+    parser.add_argument("--history", type=int, default=1_000_000, help="rounds in the round history file")
+    parser.add_argument("--only", default="rounds,pipeline,haptics,bluesky,stream,windows,sessions,session_posts,history",
+                        help="comma separated benchmarks")
+    parser.add_argument("--json", action="store_true", help="print one JSON object instead of a table")
+    args = parser.parse_args()
+
+    benches = {
+        "rounds": lambda: bench_rounds(args.rounds),
+        "pipeline": lambda: bench_pipeline(args.rounds),
+        "haptics": lambda: bench_haptics(args.detections),
+        "bluesky": lambda: bench_bluesky(args.posts),
+        "stream": lambda: bench_stream(args.posts),
+        "windows": lambda: bench_windows(args.detections),
+        "sessions": lambda: bench_sessions(args.sessions),
+        "session_posts": lambda: bench_session_posts(args.sessions),
+        "history": lambda: bench_history(args.history),
+    }
+    results = {}
+    for name in args.only.split(","):
+        name = name.strip()
+        try:
+            # The game reports every step with print; keep that out of the numbers
+            with contextlib.redirect_stdout(io.StringIO()):
+                results[name] = benches[name]()
+        except ImportError as e:
+            results[name] = {"skipped": str(e)}
+        if not args.json:
+            _print(name, results[name])
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
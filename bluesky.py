@@ -0,0 +1,554 @@
+import calendar
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urlparse
+
+from endpoints import scoreboard, rate_limiter, FAILURE_STATUSES
+from telemetry import log, metrics
+
+# -------------------------------
+# Bluesky XRPC lookups (hedged, pooled)
+# -------------------------------
+HOSTS = ["bsky.app", "bsky.social", "public.bsky.social"]
+
+# Each endpoint once (in order), so no host takes two of the hedged request slots
+FEED_CANDIDATES = list(dict.fromkeys([f"https://{host}/xrpc/app.bsky.feed.getAuthorFeed" for host in HOSTS] + [
+    "https://public.bsky.app/xrpc/app.bsky.feed.getAuthorFeed",
+    "https://public.api.bsky.app/xrpc/app.bsky.feed.getAuthorFeed",
+    "https://bsky.app/xrpc/app.bsky.feed.getAuthorFeed",
+]))
+
+REQUEST_TIMEOUT = 8      # per request, seconds
+LOOKUP_DEADLINE = 10     # whole lookup (all endpoints together), seconds
+HEDGE_FANOUT = 3         # endpoints asked immediately
+HEDGE_DELAY = 0.75       # ask one more endpoint if nobody answered within this many seconds
+WARM_INTERVAL = 30       # seconds between connection warm-ups
+
+_session = None
+_warmed_at = None
+_warm_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="xrpc")
+
+
+def get_session():
+    """Return the shared requests session.
+    All lookups go through one connection pool so keep-alive connections (and their TLS
+    handshakes) are reused between verifications. `requests` is only imported here, on
+    the first lookup.
+    """
+    global _session
+    if _session is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=16)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _session = session
+    return _session
+
+
+def _retry_after(r):
+    try:
+        return float(r.headers.get("Retry-After", 0)) or None
+    except ValueError:
+        return None
+
+
+def _xrpc_error(r):
+    """True if `r` is a regular XRPC error answer ({"error": ...}, e.g. 400 for an unknown
+    handle), which means the endpoint itself works.
+    """
+    if r.status_code >= 500 or r.status_code in FAILURE_STATUSES or r.status_code in (404, 405):
+        return False
+    try:
+        body = r.json()
+    except ValueError:
+        return False
+    return isinstance(body, dict) and isinstance(body.get("error"), str)
+
+
+def _fetch(url, params, parse, timeout, cancelled):
+    """Run a single GET and hand the response to `parse`. Returns the parsed value or None.
+    Latency and outcome are recorded on the endpoint scoreboard: the request only counts as
+    a success if `parse` got a usable value out of it or it is a regular XRPC error, so an
+    endpoint answering 404 or garbage is demoted like one that is down.
+    """
+    if cancelled():
+        return None
+    if not rate_limiter.acquire(timeout=timeout):
+        log("BLUESKY", f"Rate limit: skipping {url}", endpoint=urlparse(url).netloc)
+        return None
+    started = time.monotonic()
+    endpoint = urlparse(url).netloc
+    try:
+        r = get_session().get(url, params=params, timeout=timeout)
+    except Exception as e:
+        scoreboard.record(url, time.monotonic() - started, ok=False)
+        metrics.observe("http_request_seconds", time.monotonic() - started, endpoint=endpoint, status="error")
+        if not cancelled():
+            log("BLUESKY", f"Request exception for {url}: {e}", endpoint=endpoint)
+        return None
+    latency = time.monotonic() - started
+    metrics.observe("http_request_seconds", latency, endpoint=endpoint, status=r.status_code)
+    try:
+        # Parsed even if the lookup is over, so a late answer still grades its endpoint
+        value = parse(url, r)
+    except Exception as e:
+        log("BLUESKY", f"Failed to parse JSON from {url}: {e}", endpoint=endpoint)
+        value = None
+    scoreboard.record(url, latency, ok=value is not None or _xrpc_error(r),
+                      retry_after=_retry_after(r) if r.status_code == 429 else None)
+    if cancelled():
+        r.close()
+        return None
+    return value
+
+
+def hedged_get(urls, params=None, parse=None, deadline=LOOKUP_DEADLINE,
+               fanout=HEDGE_FANOUT, hedge_delay=HEDGE_DELAY):
+    """Ask several endpoints for the same thing and return the first valid answer.
+    `fanout` endpoints are asked at once; another one is added whenever a request fails or
+    nobody answered within `hedge_delay`. Endpoints are tried in scoreboard order and open
+    circuits are skipped. Requests not started yet are cancelled as soon as a winner is
+    found, and everything is bounded by `deadline` seconds.
+    `parse(url, response)` returns the value, or None if the answer is not usable.
+    """
+    if parse is None:
+        parse = _parse_ok_json
+    end = time.monotonic() + deadline
+    queue = scoreboard.order(urls)
+    in_flight = {}
+    done_flag = []
+
+    def cancelled():
+        return bool(done_flag) or time.monotonic() >= end
+
+    def launch():
+        url = queue.pop(0)
+        timeout = max(0.1, min(REQUEST_TIMEOUT, end - time.monotonic()))
+        in_flight[_executor.submit(_fetch, url, params, parse, timeout, cancelled)] = url
+
+    for _ in range(min(fanout, len(queue))):
+        launch()
+
+    try:
+        while in_flight:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                log("BLUESKY", f"Lookup deadline of {deadline}s reached")
+                return None
+            done, _ = wait(in_flight, timeout=min(remaining, hedge_delay) if queue else remaining,
+                           return_when=FIRST_COMPLETED)
+            if not done:
+                # Nobody answered yet: hedge with the next endpoint
+                if queue:
+                    launch()
+                continue
+            for fut in done:
+                in_flight.pop(fut)
+                result = fut.result()
+                if result is not None:
+                    return result
+                if queue:
+                    launch()
+        return None
+    finally:
+        done_flag.append(True)
+        for fut in in_flight:
+            fut.cancel()
+
+
+def configure_limits(workers=None, rate=None):
+    """Resize the request worker pool and the shared request rate (requests per second).
+    The defaults suit one player; server.py raises them for all of its sessions together.
+    """
+    global _executor
+    if workers:
+        previous, _executor = _executor, ThreadPoolExecutor(max_workers=workers, thread_name_prefix="xrpc")
+        previous.shutdown(wait=False)
+    if rate:
+        rate_limiter.rate = rate
+        rate_limiter.capacity = 2 * rate
+
+
+def warm_connections(urls=FEED_CANDIDATES, count=HEDGE_FANOUT):
+    """Open pooled keep-alive connections to the `count` hosts a lookup would ask first, so
+    the next verification skips DNS and the TLS handshake. Returns right away; does
+    nothing if the last warm-up was less than WARM_INTERVAL seconds ago.
+    """
+    global _warmed_at
+    with _warm_lock:
+        now = time.monotonic()
+        if _warmed_at is not None and now - _warmed_at < WARM_INTERVAL:
+            return
+        _warmed_at = now
+    hosts = []
+    for url in scoreboard.order(urls):
+        host = urlparse(url).netloc
+        if host not in hosts:
+            hosts.append(host)
+    for host in hosts[:count]:
+        _executor.submit(_warm_host, host)
+
+
+def _warm_host(host):
+    if not rate_limiter.acquire(timeout=0):
+        return
+    try:
+        get_session().head(f"https://{host}/xrpc/_health", timeout=REQUEST_TIMEOUT).close()
+    except Exception as e:
+        log("BLUESKY", f"Could not warm a connection to {host}: {e}", endpoint=host)
+
+
+def _parse_ok_json(url, r):
+    if r.status_code != 200:
+        return None
+    return r.json()
+
+
+# -------------------------------
+# Resolve DID from handle (robust, multi-host)
+# -------------------------------
+def extract_handle(input_str):
+    s = input_str.strip()
+    if "://" in s:
+        p = urlparse(s)
+        path = p.path
+        if path.startswith("/profile/"):
+            return path.split("/profile/")[-1]
+        parts = [seg for seg in path.split("/") if seg]
+        if parts:
+            return parts[-1]
+        return s
+    return s.lstrip('@')
+
+
+def _parse_did(url, r):
+    host = urlparse(url).netloc
+    if r.status_code != 200:
+        log("BLUESKY", f"Failed to resolve handle on {host}: {r.status_code}", endpoint=host)
+        return None
+    did = r.json().get("did")
+    if did:
+        log("BLUESKY", f"Resolved DID on {host}: {did}", endpoint=host)
+    return did
+
+
+def get_did_from_handle(handle):
+    """Resolve a handle against all known Bluesky hosts at once.
+    Accepts plain handles, @handles, or full profile URLs.
+    Returns DID string or None.
+    """
+    handle = extract_handle(handle)
+    urls = [f"https://{host}/xrpc/com.atproto.identity.resolveHandle" for host in HOSTS]
+    return hedged_get(urls, params={"handle": handle}, parse=_parse_did)
+
+
+def _unknown_actor(r):
+    """True if a 400 from getAuthorFeed says the actor does not exist (any more)."""
+    try:
+        body = r.json()
+    except ValueError:
+        return False
+    return body.get("error") == "InvalidRequest" and "not found" in str(body.get("message", "")).lower()
+
+
+def _parse_feed(url, r, did=None):
+    # Every answer is counted in http_request_seconds; only the unusable ones are logged
+    host = urlparse(url).netloc
+    if r.status_code == 200:
+        feed = r.json()
+        feed["_endpoint"] = host
+        return feed
+    if r.status_code in (401, 403):
+        log("BLUESKY", f"Authentication required at {url}: {r.status_code}", endpoint=host)
+    elif r.status_code == 400 and did and _unknown_actor(r):
+        log("BLUESKY", f"Feed endpoint {url} does not know {did}", endpoint=host)
+        forget_did(did)
+    else:
+        log("BLUESKY", f"Non-200 from {url}: {r.status_code}", endpoint=host)
+    return None
+
+
+def fetch_author_feed_try(did, limit=5, cursor=None, deadline=LOOKUP_DEADLINE):
+    """Fetch one page of the author feed without authentication from whichever candidate
+    endpoint answers first. Returns JSON feed or None. A feed that rejects `did` as an
+    unknown actor drops it from the DID cache (see forget_did()).
+    """
+    params = {"actor": did, "limit": limit}
+    if cursor:
+        params["cursor"] = cursor
+    return hedged_get(FEED_CANDIDATES, params=params, parse=lambda url, r: _parse_feed(url, r, did),
+                      deadline=deadline)
+
+
+# -------------------------------
+# Incremental feed verification
+# -------------------------------
+FEED_PAGE_LIMIT = 30
+FEED_MAX_PAGES = 5
+POLL_INTERVAL = 3       # seconds between feed polls
+CLOCK_SKEW = 5          # accept posts stamped up to this many seconds before the task started
+CLAIMED_MAX = 1024      # post URIs remembered as already used for a verdict
+
+_claimed = deque(maxlen=CLAIMED_MAX)
+_claimed_uris = set()
+_claimed_lock = threading.Lock()
+
+
+def is_claimed(uri):
+    """True if the post already won an earlier round."""
+    with _claimed_lock:
+        return uri in _claimed_uris
+
+
+def claim_post(uri):
+    """Mark a post as used for a verdict. Returns False if an earlier round already used it,
+    so the same post (e.g. the previous round's, inside CLOCK_SKEW) never wins twice.
+    """
+    with _claimed_lock:
+        if uri in _claimed_uris:
+            return False
+        if len(_claimed) == _claimed.maxlen:
+            _claimed_uris.discard(_claimed[0])
+        _claimed.append(uri)
+        _claimed_uris.add(uri)
+        return True
+
+
+def normalize_text(text):
+    return " ".join(text.casefold().split())
+
+
+def parse_timestamp(value):
+    """Parse an AT Protocol datetime ("2024-05-01T12:34:56.789Z") to epoch seconds, or None."""
+    if not value or len(value) < 19:
+        return None
+    try:
+        seconds = calendar.timegm(time.strptime(value[:19], "%Y-%m-%dT%H:%M:%S"))
+    except ValueError:
+        return None
+    tz = value[19:].lstrip(".0123456789")
+    if len(tz) == 6 and tz[0] in "+-":
+        offset = int(tz[1:3]) * 3600 + int(tz[4:6]) * 60
+        seconds -= offset if tz[0] == "+" else -offset
+    return seconds
+
+
+def _feed_posts(did, deadline, state):
+    """Yield (uri, created, normalized text, item) for the author's posts, newest first,
+    over up to FEED_MAX_PAGES pages within `deadline` seconds. Pins and reposts are
+    skipped; each item carries the host that served it under "endpoint".
+    Sets state["complete"] when the end of the feed was reached.
+    """
+    end = time.monotonic() + deadline
+    cursor = None
+    for _ in range(FEED_MAX_PAGES):
+        remaining = end - time.monotonic()
+        if remaining <= 0:
+            return
+        feed = fetch_author_feed_try(did, limit=FEED_PAGE_LIMIT, cursor=cursor, deadline=remaining)
+        if not feed:
+            return
+        for item in feed.get("feed", []):
+            reason = (item.get("reason") or {}).get("$type", "")
+            if reason.endswith("#reasonPin") or reason.endswith("#reasonRepost"):
+                # Pinned posts and reposts are not in chronological order
+                continue
+            post = item.get("post", {})
+            record = post.get("record", {})
+            created = parse_timestamp(record.get("createdAt") or post.get("indexedAt"))
+            text = post.get("text") or record.get("text") or ""
+            yield post.get("uri"), created, normalize_text(text), {**item, "endpoint": feed.get("_endpoint")}
+        cursor = feed.get("cursor")
+        if not cursor:
+            state["complete"] = True
+            return
+
+
+def find_new_post(did, post_text, since, seen, deadline=LOOKUP_DEADLINE):
+    """Page through the author's feed, newest first, looking for `post_text` in posts
+    created after `since` (epoch seconds). Paging stops at the first post that is older
+    than `since` or was already scanned by an earlier call (its URI is in `seen`). Posts
+    that already won an earlier round are skipped, and the returned one is claimed.
+    Returns the matching feed item (with the host that served it under "endpoint"), or None.
+    """
+    needle = normalize_text(post_text)
+    scanned, state = [], {}
+    for uri, created, text, item in _feed_posts(did, deadline, state):
+        if uri in seen or (created is not None and created < since):
+            state["complete"] = True
+            break
+        if needle in text and claim_post(uri):
+            return item
+        scanned.append(uri)
+    if state.get("complete"):
+        seen.update(scanned)
+    return None
+
+
+def new_posts(did, since, seen, deadline=LOOKUP_DEADLINE):
+    """The author's posts created after `since` that are not in `seen`, newest first, as
+    (uri, created, normalized text, item). Paging stops like find_new_post(); once the
+    scan is complete the posts are added to `seen`.
+    """
+    found, state = [], {}
+    for post in _feed_posts(did, deadline, state):
+        uri, created = post[0], post[1]
+        if uri in seen or (created is not None and created < since):
+            state["complete"] = True
+            break
+        found.append(post)
+    if state.get("complete"):
+        seen.update(post[0] for post in found)
+    return found
+
+
+def watch_for_post(did, post_text, since, deadline, is_active, interval=POLL_INTERVAL):
+    """Poll the feed until a post containing `post_text` shows up.
+    Gives up when `deadline` (a time.monotonic() value) passes or is_active() turns False.
+    Each poll only scans posts that earlier polls have not seen yet.
+    Returns the matching feed item, or None.
+    """
+    seen = set()
+    since -= CLOCK_SKEW
+    while is_active():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        item = find_new_post(did, post_text, since, seen, deadline=min(LOOKUP_DEADLINE, remaining))
+        if item:
+            return item
+        time.sleep(max(0, min(interval, deadline - time.monotonic())))
+    return None
+
+
+# -------------------------------
+# Persistent handle -> DID cache
+# -------------------------------
+DID_CACHE_PATH = "did_cache.json"
+DID_CACHE_TTL = 7 * 24 * 3600   # refresh entries older than this in the background
+
+_did_cache = None
+_did_lock = threading.Lock()
+_account_handle = None
+_account_ready = threading.Event()
+
+
+def _load_did_cache():
+    global _did_cache
+    if _did_cache is None:
+        try:
+            with open(DID_CACHE_PATH, "r") as f:
+                _did_cache = json.load(f)
+        except (OSError, ValueError):
+            _did_cache = {}
+    return _did_cache
+
+
+def _save_did_cache():
+    tmp_path = DID_CACHE_PATH + ".tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump(_did_cache, f, indent=2)
+        os.replace(tmp_path, DID_CACHE_PATH)
+    except OSError as e:
+        log("BLUESKY", f"Could not write {DID_CACHE_PATH}: {e}")
+
+
+def cached_did(handle, max_age=DID_CACHE_TTL):
+    """Return the cached DID for `handle`, or None if unknown or older than `max_age` seconds.
+    Pass max_age=None to accept entries of any age.
+    """
+    handle = extract_handle(handle)
+    with _did_lock:
+        entry = _load_did_cache().get(handle)
+    if not entry:
+        return None
+    if max_age is not None and time.time() - entry.get("resolved_at", 0) > max_age:
+        return None
+    return entry.get("did")
+
+
+def resolve_did(handle):
+    """Resolve `handle` over the network and store the result in the cache."""
+    handle = extract_handle(handle)
+    did = get_did_from_handle(handle)
+    if did:
+        with _did_lock:
+            _load_did_cache()[handle] = {"did": did, "resolved_at": time.time()}
+            _save_did_cache()
+    return did
+
+
+def invalidate_did(handle=None):
+    """Drop one cached handle, or the whole cache if no handle is given."""
+    with _did_lock:
+        cache = _load_did_cache()
+        if handle is None:
+            cache.clear()
+        else:
+            cache.pop(extract_handle(handle), None)
+        _save_did_cache()
+
+
+def forget_did(did):
+    """Drop every cached handle that resolved to `did`, e.g. after the account moved to a
+    new DID and the feed no longer knows the old one. If the configured account was among
+    them, it is resolved again in the background.
+    """
+    with _did_lock:
+        handles = [handle for handle, entry in _load_did_cache().items() if entry.get("did") == did]
+    for handle in handles:
+        log("BLUESKY", f"Dropping cached DID {did} for {handle}")
+        invalidate_did(handle)
+    if _account_handle in handles:
+        warm_did_cache(_account_handle)
+
+
+def warm_did_cache(account):
+    """Make sure the configured account's DID is known, without blocking the caller.
+    A fresh cache entry is used as is; otherwise the handle is resolved on a background
+    thread. A stale entry stays usable while it is being refreshed.
+    """
+    global _account_handle
+    handle = extract_handle(account or "")
+    if not handle or " " in handle:
+        log("BLUESKY", "No valid bluesky_account in config.json, Bluesky tasks will fail")
+        _account_handle = None
+        _account_ready.set()
+        return
+    _account_handle = handle
+    if cached_did(handle):
+        log("BLUESKY", f"Using cached DID for {handle}")
+        _account_ready.set()
+        return
+
+    _account_ready.clear()
+
+    def _warm():
+        try:
+            if not resolve_did(handle):
+                log("BLUESKY", f"Could not resolve {handle} in the background")
+        finally:
+            _account_ready.set()
+
+    threading.Thread(target=_warm, daemon=True).start()
+
+
+def account_did(wait=0):
+    """Return the configured account's DID from the cache; never resolves inline.
+    If the background warm-up is still running, wait up to `wait` seconds for it.
+    """
+    if _account_handle is None:
+        return None
+    did = cached_did(_account_handle, max_age=None)
+    if did is None and wait > 0 and _account_ready.wait(wait):
+        did = cached_did(_account_handle, max_age=None)
+    return did
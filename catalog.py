@@ -0,0 +1,236 @@
+import json
+import os
+import random
+import threading
+import time
+from typing import NamedTuple, Optional
+
+from waveforms import compile_waveform
+
+# -------------------------------
+# Task catalog (validated, indexed, weighted, hot-reloaded)
+# -------------------------------
+TASKS_PATH = "tasks.json"
+RELOAD_CHECK_INTERVAL = 1.0     # seconds between mtime checks of tasks.json
+LOAD_WAIT = 10.0                # seconds current() waits for a first load still in progress
+
+# Fields a task of a known type must have, besides name and duration
+REQUIRED_FIELDS = {
+    "open_link": ("link",),
+    "bluesky_post": ("post_text",),
+}
+
+
+class Task(NamedTuple):
+    type: str
+    name: str
+    duration: int
+    weight: float = 1.0
+    link: Optional[str] = None
+    window_title: Optional[str] = None
+    post_text: Optional[str] = None
+    bluesky_open: bool = False
+    bluesky_did: Optional[str] = None
+    waveforms: Optional[dict] = None
+
+    def as_dict(self):
+        """A fresh, mutable dict for one round, without the fields the task does not set."""
+        return {k: v for k, v in self._asdict().items() if v is not None and v is not False}
+
+
+def parse_task(entry):
+    """Validate one tasks.json entry into a Task. Raises ValueError with the reason."""
+    if not isinstance(entry, dict):
+        raise ValueError("not an object")
+    name = entry.get("name")
+    if not isinstance(name, str) or not name:
+        raise ValueError("missing name")
+    task_type = entry.get("type", "")
+    if not isinstance(task_type, str):
+        raise ValueError("type must be a string")
+    duration = entry.get("duration")
+    if isinstance(duration, bool) or not isinstance(duration, (int, float)) or duration < 0:
+        raise ValueError("duration must be a number >= 0")
+    weight = entry.get("weight", 1)
+    if isinstance(weight, bool) or not isinstance(weight, (int, float)) or weight <= 0:
+        raise ValueError("weight must be a number > 0")
+    for field in REQUIRED_FIELDS.get(task_type, ()):
+        if not entry.get(field):
+            raise ValueError(f"{task_type} task needs '{field}'")
+    waveforms = entry.get("waveforms")
+    if waveforms is not None:
+        if not isinstance(waveforms, dict):
+            raise ValueError("waveforms must be an object")
+        for cue, spec in waveforms.items():
+            try:
+                compile_waveform(spec)
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                raise ValueError(f"bad {cue} waveform: {e}") from e
+    return Task(
+        type=task_type,
+        name=name,
+        duration=int(duration),
+        weight=float(weight),
+        link=entry.get("link"),
+        window_title=entry.get("window_title"),
+        post_text=entry.get("post_text"),
+        bluesky_open=bool(entry.get("bluesky_open")),
+        bluesky_did=entry.get("bluesky_did"),
+        waveforms=waveforms,
+    )
+
+
+def name_key(name):
+    """A task name as the round history and weight factors know it: whitespace runs are
+    collapsed to one space and the ends trimmed, so "Stretch  break" and "Stretch break"
+    are the same task.
+    """
+    return " ".join(str(name).split())
+
+
+class AliasTable:
+    """Walker/Vose alias table: draws index i with probability weights[i] / sum(weights) in O(1)."""
+
+    def __init__(self, weights):
+        n = len(weights)
+        total = float(sum(weights))
+        scaled = [w * n / total for w in weights]
+        self.prob = [1.0] * n
+        self.alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+
+    def draw(self, rng=random):
+        i = int(rng.random() * len(self.prob))
+        return i if rng.random() < self.prob[i] else self.alias[i]
+
+
+class TaskCatalog:
+    """An immutable set of validated tasks with weighted sampling."""
+
+    def __init__(self, tasks):
+        self.tasks = tuple(tasks)
+        if not self.tasks:
+            raise ValueError("no valid tasks")
+        self._by_name = {}
+        for task in self.tasks:
+            self._by_name.setdefault(task.name, []).append(task)
+        self._table = AliasTable([t.weight for t in self.tasks])
+
+    @classmethod
+    def from_entries(cls, entries, source=TASKS_PATH):
+        if not isinstance(entries, list):
+            raise ValueError(f"{source} must contain a list of tasks")
+        tasks = []
+        for i, entry in enumerate(entries):
+            try:
+                tasks.append(parse_task(entry))
+            except ValueError as e:
+                name = entry.get("name") if isinstance(entry, dict) else None
+                print(f"[TASKS] Skipping task #{i + 1}{f' ({name})' if name else ''} in {source}: {e}")
+        return cls(tasks)
+
+    @classmethod
+    def load(cls, path=TASKS_PATH):
+        with open(path, "r") as f:
+            return cls.from_entries(json.load(f), source=path)
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def has(self, task):
+        """True if `task` is still in the catalog unchanged, apart from its weight."""
+        return any(t._replace(weight=task.weight) == task for t in self._by_name.get(task.name, ()))
+
+    def reweighted(self, factors):
+        """A copy whose task weights are multiplied by factors[name] (1 for missing names).
+        Names are compared by name_key().
+        """
+        if not factors:
+            return self
+        factors = {name_key(name): factor for name, factor in factors.items()}
+        return TaskCatalog(t._replace(weight=t.weight * factors.get(name_key(t.name), 1.0)) for t in self.tasks)
+
+    def sample(self, rng=random):
+        """Draw a task by weight."""
+        return self.tasks[self._table.draw(rng)]
+
+
+class TaskSource:
+    """The current catalog for a tasks file. The file's mtime is checked at most every
+    RELOAD_CHECK_INTERVAL seconds; a changed file is parsed into a new catalog that
+    replaces the old one in a single assignment. A broken file keeps the old catalog.
+    With load=False the first load() is left to the caller (e.g. a background thread);
+    current() waits up to LOAD_WAIT seconds for it.
+    set_factors() scales task weights by name (e.g. from the round history); the factors
+    survive reloads.
+    """
+
+    def __init__(self, path=TASKS_PATH, load=True):
+        self.path = path
+        self.catalog = None
+        self.factors = {}
+        self._base = None       # catalog as read from the file, before factors
+        self._mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._loaded = threading.Event()
+        if load:
+            self.load()
+
+    def load(self):
+        """Read the tasks file for the first time. Raises if it is missing or has no valid task."""
+        try:
+            if not os.path.exists(self.path):
+                raise FileNotFoundError(f"JSON file not found: {self.path}")
+            self._mtime = os.stat(self.path).st_mtime_ns
+            self._base = TaskCatalog.load(self.path)
+            self.catalog = self._base.reweighted(self.factors)
+            self._checked_at = time.monotonic()
+        finally:
+            self._loaded.set()
+        return self.catalog
+
+    def current(self):
+        """Return the up-to-date catalog."""
+        if self.catalog is None:
+            self._loaded.wait(LOAD_WAIT)
+            if self.catalog is None:
+                raise RuntimeError(f"No tasks loaded from {self.path}")
+        if time.monotonic() - self._checked_at >= RELOAD_CHECK_INTERVAL:
+            self.reload_if_changed()
+        return self.catalog
+
+    def reload_if_changed(self):
+        with self._lock:
+            self._checked_at = time.monotonic()
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError as e:
+                print(f"[TASKS] Cannot read {self.path}, keeping {len(self.catalog)} tasks: {e}")
+                return False
+            if mtime == self._mtime:
+                return False
+            self._mtime = mtime
+            try:
+                catalog = TaskCatalog.load(self.path)
+            except (OSError, ValueError) as e:
+                print(f"[TASKS] Could not reload {self.path}, keeping {len(self.catalog)} tasks: {e}")
+                return False
+            self._base = catalog
+            self.catalog = catalog.reweighted(self.factors)
+        print(f"[TASKS] Reloaded {self.path}: {len(catalog)} tasks")
+        return True
+
+    def set_factors(self, factors):
+        """Multiply each task's weight by factors[name] from now on."""
+        with self._lock:
+            self.factors = dict(factors)
+            if self._base is not None:
+                self.catalog = self._base.reweighted(self.factors)
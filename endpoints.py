@@ -0,0 +1,150 @@
+import atexit
+import json
+import os
+import threading
+import time
+
+# -------------------------------
+# Endpoint scoreboard (latency, circuit breaker, rate limit)
+# -------------------------------
+STATS_PATH = "endpoint_stats.json"
+
+EWMA_ALPHA = 0.3            # weight of the newest latency sample
+FAILURE_THRESHOLD = 3       # consecutive failures before the circuit opens
+BREAKER_COOLDOWN = 60       # seconds an open circuit stays open (doubles on every re-trip)
+BREAKER_MAX_COOLDOWN = 1800
+SAVE_INTERVAL = 30          # seconds between writes of the stats file
+
+# Status codes that say "this endpoint is unusable for us", as opposed to
+# a regular answer such as 400 for an unknown handle.
+FAILURE_STATUSES = (401, 403, 429)
+
+
+class TokenBucket:
+    """Shared token bucket: `rate` requests per second with bursts of up to `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        """Take one token, waiting up to `timeout` seconds. Returns False if none came free."""
+        end = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if end is not None:
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+
+class Scoreboard:
+    """Per-endpoint health: smoothed latency, failure counts and a circuit breaker.
+    State is kept in a JSON file so a bad endpoint stays demoted across runs.
+    """
+
+    def __init__(self, path=STATS_PATH):
+        self.path = path
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._last_save = 0.0
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, "r") as f:
+                self._stats = json.load(f)
+        except (OSError, ValueError):
+            self._stats = {}
+
+    def save(self, force=False):
+        with self._lock:
+            if not self._dirty or (not force and time.monotonic() - self._last_save < SAVE_INTERVAL):
+                return
+            data = json.dumps(self._stats, indent=2)
+            self._dirty = False
+            self._last_save = time.monotonic()
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"[ENDPOINTS] Could not write {self.path}: {e}")
+
+    def _entry(self, url):
+        entry = self._stats.get(url)
+        if entry is None:
+            entry = self._stats[url] = {
+                "latency": None, "ok": 0, "failed": 0,
+                "consecutive_failures": 0, "open_until": 0, "cooldown": BREAKER_COOLDOWN,
+            }
+        return entry
+
+    def record(self, url, latency, ok, retry_after=None):
+        """Record the outcome of one request to `url`."""
+        with self._lock:
+            entry = self._entry(url)
+            if entry["latency"] is None:
+                entry["latency"] = latency
+            else:
+                entry["latency"] += EWMA_ALPHA * (latency - entry["latency"])
+            if ok:
+                entry["ok"] += 1
+                entry["consecutive_failures"] = 0
+                entry["cooldown"] = BREAKER_COOLDOWN
+                entry["open_until"] = 0
+            else:
+                entry["failed"] += 1
+                entry["consecutive_failures"] += 1
+                if retry_after or entry["consecutive_failures"] >= FAILURE_THRESHOLD:
+                    cooldown = retry_after or entry["cooldown"]
+                    entry["open_until"] = time.time() + cooldown
+                    entry["cooldown"] = min(BREAKER_MAX_COOLDOWN, entry["cooldown"] * 2)
+                    print(f"[ENDPOINTS] Circuit open for {url} ({cooldown:.0f}s)")
+            self._dirty = True
+        self.save()
+
+    def _score(self, entry):
+        # Expected cost of asking this endpoint: latency inflated by its failure rate.
+        total = entry["ok"] + entry["failed"]
+        failure_rate = entry["failed"] / total if total else 0.0
+        latency = entry["latency"] if entry["latency"] is not None else 0.5
+        return latency * (1 + 4 * failure_rate)
+
+    def order(self, urls):
+        """Return `urls` best-first, without endpoints whose circuit is open.
+        Unknown endpoints are tried with a neutral score. If every circuit is open,
+        all endpoints are returned sorted by which one reopens first.
+        """
+        now = time.time()
+        with self._lock:
+            entries = [(url, self._stats.get(url)) for url in urls]
+            closed = [(url, e) for url, e in entries if e is None or e["open_until"] <= now]
+            if closed:
+                closed.sort(key=lambda item: 0.5 if item[1] is None else self._score(item[1]))
+                return [url for url, _ in closed]
+            entries.sort(key=lambda item: item[1]["open_until"])
+            return [url for url, _ in entries]
+
+    def snapshot(self):
+        with self._lock:
+            return json.loads(json.dumps(self._stats))
+
+
+scoreboard = Scoreboard()
+rate_limiter = TokenBucket(rate=5, capacity=10)
+atexit.register(scoreboard.save, True)
@@ -0,0 +1,429 @@
+import random
+import threading
+import time
+
+from scheduler import TimerGroup
+from telemetry import log
+from waveforms import DEFAULT_CUES, get_waveform, task_cue, play as stream_waveform
+
+# -------------------------------
+# Round logic (no UI, devices or network of its own)
+# -------------------------------
+ACCOUNT_WAIT = 10   # seconds to wait for a still-running DID warm-up
+POST_COUNTDOWN = 10 # seconds the player gets to post
+VERIFY_GRACE = 20   # extra seconds a lagging relay gets after the countdown
+ROUND_GAP = 3       # seconds between rounds in a round sequence
+
+
+class Actions:
+    """What the Open button does outside the game: open links and fill the clipboard."""
+
+    def open_link(self, url):
+        import webbrowser
+        webbrowser.open(url)
+
+    def copy(self, text):
+        import pyperclip
+        pyperclip.copy(text)
+
+
+def _spawn(target, *args):
+    threading.Thread(target=target, args=args, daemon=True).start()
+
+
+class Game:
+    """One player's Simon Says game.
+    Everything it talks to is passed in, so the same rounds run behind the Tk window or
+    headless against stand-ins:
+      scheduler  - Scheduler for all round timers (its clock is the game's monotonic clock)
+      tasks      - TaskSource (anything with current().sample())
+      windows    - WindowWatcher
+      output     - output(level) drives the devices, 0 meaning stop
+      ui         - show(text) and set_buttons(state)
+      bluesky    - watch_for_post() and account_did(), normally the bluesky module; one
+                   with watch(..., done) instead hands the post to done() without
+                   holding the spawned worker while it waits
+      actions    - open_link(url) and copy(text)
+      spawn      - spawn(target, *args) runs blocking work (the feed watcher, prefetching)
+      prefetch   - optional prefetch(task, current) that readies the next round's task
+                   while `current` is still being played (see prefetch.py)
+    Listeners added to `listeners` are called as listener(event, **fields) for the
+    "pick", "detect", "action" (Open/Nothing pressed), "countdown", "verify_start",
+    "verify", "verdict" and "penalty_done" events.
+    Round state is only changed on the scheduler thread: UIs call pick_task, open_task and
+    do_nothing_task through scheduler.call_soon(), and spawned workers hand their
+    results back the same way.
+    With a prefetch, every round chooses its successor as soon as it has started.
+    start_sequence() plays rounds back to back, ROUND_GAP seconds apart.
+    """
+
+    def __init__(self, scheduler, tasks, windows, output, ui, bluesky=None, actions=None,
+                 spawn=_spawn, wall_clock=time.time, rng=random, prefetch=None):
+        self.scheduler = scheduler
+        self.tasks = tasks
+        self.windows = windows
+        self.output = output
+        self.ui = ui
+        self.bluesky = bluesky
+        self.actions = actions or Actions()
+        self.spawn = spawn
+        self.wall_clock = wall_clock
+        self.rng = rng
+        self.prefetch = prefetch
+        self.listeners = []
+        self.current_task = None
+        self.task_active = False
+        self.penalty_playing = False    # between a failed verdict and penalty_done
+        self.vibration_level = 0
+        self.round_timers = TimerGroup(scheduler)
+        self._waveform = None
+        self.next_task = None           # chosen (and being prefetched) during the current round
+        self._next_record = None
+        self.continuous = False
+        self.round_gap = ROUND_GAP
+        self._next_round = None
+
+    def _emit(self, event, **fields):
+        for listener in list(self.listeners):
+            try:
+                listener(event, **fields)
+            except Exception as e:
+                print(f"[GAME] Listener failed on {event}: {e}")
+
+    def _still_current(self, task):
+        return self.task_active and self.current_task is task
+
+    # --- Vibration ---
+    def _output_level(self, level):
+        self.vibration_level = level
+        self.output(level)
+
+    def play_cue(self, cue, on_done=None):
+        """Play the current task's waveform for `cue` (see waveforms.py), replacing the current one."""
+        if self._waveform:
+            self._waveform.cancel()
+        spec = task_cue(self.current_task, cue)
+        try:
+            samples = get_waveform(spec)
+        except ValueError as e:
+            log("VIBRATION", f"Bad {cue} waveform {spec!r}: {e}")
+            samples = get_waveform(DEFAULT_CUES[cue])
+        self._waveform = stream_waveform(self.scheduler, samples, self._output_level, on_done)
+
+    def set_vibration(self, level: int):
+        if self._waveform:
+            self._waveform.cancel()
+            self._waveform = None
+        self._output_level(max(0, min(100, int(level))))
+
+    def stop_vibration(self):
+        self.set_vibration(0)
+
+    # --- Window detection ---
+    def is_task_running(self, task):
+        if "window_title" in task:
+            return self.windows.is_open(task["window_title"])
+        # If the task doesn't specify a window_title we should not assume it's running
+        return False
+
+    def monitor_task_start_and_countdown(self, task):
+        """Wait for the task's window, then run its countdown. Driven by window watcher events
+        and the round's timers, so nothing keeps running once the round is over.
+        """
+        if "window_title" not in task or task.get("monitoring"):
+            return
+        task["monitoring"] = True
+        timers = self.round_timers
+
+        def check():
+            if not self._still_current(task) or task.get("counting"):
+                return
+            # For bluesky_post tasks we do NOT start the countdown here; countdown should begin
+            # only after the user explicitly presses the Open button (so they have to perform the action).
+            if self.is_task_running(task):
+                self.stop_vibration()
+                log("VIBRATION", "Task detected, stop 30% vibration, starting countdown")
+                self._emit("detect", task=task)
+                if task["duration"]>0:
+                    task["counting"] = True
+                    self.countdown_task(task, task["duration"])
+
+        subscription = self.windows.subscribe(task["window_title"],
+                                              lambda _pattern, present: present and timers.call_soon(check))
+        timers.add_cleanup(lambda: self.windows.unsubscribe(subscription))
+        timers.call_soon(check)
+
+    def _label(self, task, remaining):
+        # Preserve "Simon says" prefix
+        simon_prefix = "Simon says: " if task.get('simon') else ""
+        self.ui.show(f"{simon_prefix}{task['name']} ({remaining}s left)")
+
+    def countdown_task(self, task, seconds):
+        def tick(remaining):
+            if not self._still_current(task):
+                return
+            self._label(task, remaining)
+
+            # If the task requires a window to be open, check every second
+            if "window_title" in task:
+                if not self.is_task_running(task):
+                    log("RULE", "Required window closed before time was up. Fail.")
+                    self.end_task(success=False)
+
+        def done():
+            # After countdown finishes
+            if self._still_current(task):
+                self._emit("countdown", task=task)
+                self.end_task(success=True)
+
+        self.round_timers.countdown(seconds, tick, done)
+
+    # --- Round end ---
+    def penalty_vibration(self):
+        self.penalty_playing = False
+        self.stop_vibration()
+        log("VIBRATION", "Penalty finished, vibration stopped")
+        self.ui.set_buttons("normal")
+        self._emit("penalty_done", task=self.current_task)
+        self._schedule_next_round()
+
+    def end_task(self, success=True):
+        self.task_active = False
+        self.round_timers.cancel()
+        self._emit("verdict", task=self.current_task, success=success)
+        if success:
+            self.stop_vibration()
+            log("VIBRATION", "Task completed correctly, stop vibration")
+            self.ui.set_buttons("normal")
+            self._schedule_next_round()
+        else:
+            log("VIBRATION", "Wrong or abandoned! Penalty waveform")
+            self.ui.set_buttons("disabled")
+            self.penalty_playing = True
+            self.play_cue("penalty", on_done=self.penalty_vibration)
+
+    # --- Bluesky ---
+    def verify_bluesky_post(self, task, deadline):
+        """Watch the feed for the task's post from the moment Open is pressed.
+        Ends the round as soon as a matching post created after the task started shows up,
+        or fails it once `deadline` (scheduler clock) has passed. Runs on a spawned worker;
+        the verdict itself is handed back to the scheduler thread.
+        """
+        def still_current():
+            return self._still_current(task)
+
+        post_text = task.get("post_text", "")
+        bluesky_did = task.get("bluesky_did")
+        if not post_text:
+            log("BLUESKY", "Verification skipped: missing post text")
+            self.scheduler.call_soon(self._end_if_current, task, False)
+            return
+
+        if not bluesky_did:
+            # The configured account is resolved in the background at startup;
+            # only wait for that warm-up here, never resolve or prompt on this thread.
+            bluesky_did = self.bluesky.account_did(wait=ACCOUNT_WAIT)
+            if not bluesky_did:
+                log("BLUESKY", "Could not resolve DID (check bluesky_account in config.json), task will fail.")
+                self.scheduler.call_soon(self._end_if_current, task, False)
+                return
+
+        log("BLUESKY", "Watching Bluesky feed for the post...")
+        self.scheduler.call_soon(self._start_verify, task)
+        if hasattr(self.bluesky, "watch"):
+            self.bluesky.watch(bluesky_did, post_text, task["started_at"], deadline, still_current,
+                               lambda item: self.scheduler.call_soon(self._finish_verify, task, item))
+            return
+        item = self.bluesky.watch_for_post(bluesky_did, post_text, task["started_at"], deadline, still_current)
+        self.scheduler.call_soon(self._finish_verify, task, item)
+
+    def _start_verify(self, task):
+        if self._still_current(task):
+            self._emit("verify_start", task=task)
+
+    def _finish_verify(self, task, item):
+        if not self._still_current(task):
+            return
+        self._emit("verify", task=task, found=bool(item), endpoint=(item or {}).get("endpoint"))
+        post_text = task.get("post_text", "")
+        if item:
+            log("BLUESKY", f"Post found: '{post_text}'")
+            self.end_task(success=True)
+        else:
+            log("BLUESKY", f"No matching post found for '{post_text}'")
+            self.end_task(success=False)
+
+    def _end_if_current(self, task, success):
+        if self._still_current(task):
+            self.end_task(success=success)
+
+    # --- Round sequence ---
+    def start_sequence(self, gap=None):
+        """Play rounds back to back: each verdict (or penalty) is followed by the next pick
+        `gap` seconds later. Starts a round now unless one is running; during a penalty
+        the next round follows the penalty.
+        """
+        if gap is not None:
+            self.round_gap = gap
+        self.continuous = True
+        if not self.task_active and not self.penalty_playing and self._next_round is None:
+            self.pick_task()
+
+    def stop_sequence(self):
+        """Let the current round finish without starting another."""
+        self.continuous = False
+        if self._next_round is not None:
+            self._next_round.cancel()
+            self._next_round = None
+
+    def _schedule_next_round(self):
+        if self.continuous and self._next_round is None:
+            self._next_round = self.scheduler.call_later(self.round_gap, self._start_next_round)
+
+    def _start_next_round(self):
+        self._next_round = None
+        if self.continuous and not self.task_active and not self.penalty_playing:
+            self.pick_task()
+
+    def prepare_next(self):
+        """Choose the next round's task now and have `prefetch` ready it in the background."""
+        catalog = self.tasks.current()
+        record = catalog.sample(rng=self.rng)
+        self._next_record, self.next_task = record, record.as_dict()
+        self.spawn(self._prefetch, self.next_task, self.current_task)
+
+    def _prefetch(self, task, current):
+        try:
+            self.prefetch(task, current)
+        except Exception as e:
+            log("PREFETCH", f"Could not prepare '{task['name']}': {e}")
+
+    def _take_next(self, catalog):
+        """The prepared task, unless the catalog has since dropped or changed it."""
+        task, record = self.next_task, self._next_record
+        self.next_task = self._next_record = None
+        if task is not None and catalog.has(record):
+            return task
+        return catalog.sample(rng=self.rng).as_dict()
+
+    # --- Buttons ---
+    def pick_task(self):
+        if self.penalty_playing:
+            # The penalty always plays out; the buttons come back when it is over
+            log("RULE", "Penalty still running, no new task yet")
+            return
+        if self._next_round is not None:
+            self._next_round.cancel()
+            self._next_round = None
+        self.round_timers.cancel()
+        self.round_timers = TimerGroup(self.scheduler)
+        # fresh dict per round, so the catalog's records are never mutated
+        task = self.current_task = self._take_next(self.tasks.current())
+        # decide whether this task is prefixed with "Simon says"
+        simon_flag = self.rng.random() < 0.5
+        task['simon'] = simon_flag
+        task['started_at'] = self.wall_clock()
+        simon_prefix = "Simon says: " if simon_flag else ""
+        self.ui.show(f"{simon_prefix}{task['name']} ({task['duration']}s)")
+        self.task_active = True
+        self._emit("pick", task=task)
+        self.play_cue("start")
+        log("VIBRATION", f"Start cue: {task_cue(task, 'start')}")
+        # keep buttons enabled so user can respond; monitoring thread will still run for detection
+
+        # Do not auto-open links or copy clipboard here — wait for the user's button press
+        # Info messages only
+        if task.get("type")=="open_link" and "link" in task:
+            log("INFO", f"Link available: {task['link']}")
+
+        if task.get("type")=="bluesky_post" and "post_text" in task:
+            log("BLUESKY", "Post text ready to copy when you press the button")
+            if task.get("bluesky_open"):
+                log("INFO", "Bluesky profile can be opened when you press the button")
+
+        # Start the monitor only for tasks that rely on window detection or a duration-based countdown.
+        # Bluesky posts require the user to press Open first, so don't spawn the monitor here for them.
+        if task["duration"]>0 and task.get("type")!="bluesky_post":
+            self.monitor_task_start_and_countdown(task)
+        else:
+            self.ui.set_buttons("normal")
+
+        # The round is set up; get the one after it ready while this one is played
+        if self.prefetch:
+            self.prepare_next()
+
+    def open_task(self):
+        if not self.task_active:
+            return
+        task = self.current_task
+        self._emit("action", task=task, action="open")
+
+        # If Simon didn't say, pressing this is an instant fail
+        if task and not task.get('simon'):
+            log("RULE", "Simon didn't say! You lose.")
+            self.end_task(success=False)
+            return
+
+        # Otherwise, run the actual task
+        try:
+            if task.get("type")=="open_link" and "link" in task:
+                log("ACTION", f"Opening link: {task['link']}")
+                self.actions.open_link(task["link"])
+
+            if task.get("type")=="bluesky_post" and "post_text" in task:
+                if task.get("verifying"):
+                    # One watcher and one countdown per round, however often Open is pressed
+                    log("BLUESKY", "Already watching the feed for this post")
+                    return
+                task["verifying"] = True
+                try:
+                    self.actions.copy(task["post_text"])
+                    log("BLUESKY", "Post text copied to clipboard")
+                except Exception:
+                    log("BLUESKY", "Could not copy to clipboard")
+
+                if task.get("bluesky_open"):
+                    log("ACTION", "Opening Bluesky profile")
+                    self.actions.open_link("https://bsky.app")
+
+                # Start watching the feed right away so a quick post wins immediately;
+                # the countdown only drives the label.
+                deadline = self.scheduler.clock() + POST_COUNTDOWN + VERIFY_GRACE
+                self.run_short_countdown(POST_COUNTDOWN)
+                self.spawn(self.verify_bluesky_post, task, deadline)
+
+            # For non-bluesky tasks, now rely on monitor/countdown instead of ending instantly
+            elif task.get("duration", 0) > 0:
+                self.monitor_task_start_and_countdown(task)
+
+        except Exception as e:
+            log("ACTION", f"Exception performing action: {e}")
+            self.end_task(success=False)
+
+    def run_short_countdown(self, seconds=60):
+        task = self.current_task
+
+        def tick(remaining):
+            if self._still_current(task):
+                self._label(task, remaining)
+
+        def done():
+            # The feed watcher keeps going until its deadline
+            if self._still_current(task) and task.get("type") == "bluesky_post":
+                self._emit("countdown", task=task)
+                self.ui.show("Simon is checking...")
+
+        self.round_timers.countdown(seconds, tick, done)
+
+    def do_nothing_task(self):
+        if not self.task_active:
+            return
+        self._emit("action", task=self.current_task, action="nothing")
+
+        # If Simon didn't say, doing nothing is correct
+        if self.current_task and not self.current_task.get('simon'):
+            log("RULE", "Correct! You ignored the command.")
+            self.end_task(success=True)
+        else:
+            log("RULE", "Simon DID say, but you did nothing. Fail.")
+            self.end_task(success=False)
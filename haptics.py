@@ -0,0 +1,339 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+
+import telemetry
+
+# -------------------------------
+# Haptic command queue (coalescing, in order, acknowledged)
+# -------------------------------
+MIN_COMMAND_INTERVAL = 0.05     # seconds between two commands to the same device
+COMMAND_TIMEOUT = 2.0           # seconds a device gets to acknowledge a command
+LATENCY_SAMPLES = 200           # command->ack latencies kept for the percentiles
+RECONNECT_MIN = 1.0             # first reconnect delay, seconds (doubles per failed attempt)
+RECONNECT_MAX = 30.0
+
+
+class HapticMetrics:
+    """Counts and command->ack latencies of one device's commands."""
+
+    def __init__(self):
+        self.submitted = 0
+        self.sent = 0
+        self.acked = 0
+        self.failed = 0
+        self.coalesced = 0
+        self.last_error = None
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._lock = threading.Lock()
+
+    def record(self, latency, error=None):
+        with self._lock:
+            self.sent += 1
+            if error is None:
+                self.acked += 1
+                self._latencies.append(latency)
+            else:
+                self.failed += 1
+                self.last_error = error
+
+    def latencies(self):
+        """The recent command->ack latencies, oldest first."""
+        with self._lock:
+            return list(self._latencies)
+
+    def snapshot(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = {
+                "submitted": self.submitted, "sent": self.sent, "acked": self.acked,
+                "failed": self.failed, "coalesced": self.coalesced, "last_error": self.last_error,
+            }
+        if latencies:
+            stats["latency_p50"] = latencies[len(latencies) // 2]
+            stats["latency_p95"] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            stats["latency_max"] = latencies[-1]
+        return stats
+
+
+class CommandQueue:
+    """Delivers commands to one device in order, at most one in flight at a time.
+    While a command is in flight, newer submissions replace the waiting one (latest value
+    wins), so a burst of set/stop calls turns into at most one extra command. Commands are
+    spaced at least `min_interval` apart, and every ack or failure is recorded in `metrics`
+    with its latency from submission (including any wait in the queue) to ack.
+    `send(command, value)` must return a coroutine that finishes when the device acked.
+    `round_id()` names the round a command belongs to in the trace, read when it is queued;
+    by default the global tracer's current round.
+    """
+
+    def __init__(self, loop, send, name="device", min_interval=MIN_COMMAND_INTERVAL,
+                 timeout=COMMAND_TIMEOUT, round_id=None):
+        self.loop = loop
+        self.send = send
+        self.name = name
+        self.min_interval = min_interval
+        self.timeout = timeout
+        self.round_id = round_id or (lambda: telemetry.tracer.round_id)
+        self.metrics = HapticMetrics()
+        self._pending = None
+        self._pending_since = 0.0
+        self._pending_round = None
+        self._worker = None
+        self._last_sent_at = 0.0
+        self._last_acked = None
+
+    def submit(self, command, value=None):
+        """Queue `command` from any thread."""
+        self.loop.call_soon_threadsafe(self.put, command, value)
+
+    def put(self, command, value=None):
+        """Queue `command`; must be called on the queue's loop."""
+        self.metrics.submitted += 1
+        if self._pending is not None:
+            self.metrics.coalesced += 1
+        self._pending = (command, value)
+        self._pending_since = time.monotonic()
+        self._pending_round = self.round_id()
+        if self._worker is None or self._worker.done():
+            self._worker = self.loop.create_task(self._drain())
+
+    async def _drain(self):
+        while self._pending is not None:
+            wait = self._last_sent_at + self.min_interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            command, started, round_id = self._pending, self._pending_since, self._pending_round
+            self._pending = None
+            if command == self._last_acked:
+                # The device is already in this state
+                self.metrics.coalesced += 1
+                continue
+            self._last_sent_at = time.monotonic()
+            try:
+                await asyncio.wait_for(self.send(*command), self.timeout)
+            except Exception as e:
+                error = str(e) or type(e).__name__
+                self.metrics.record(time.monotonic() - started, error=error)
+                self._last_acked = None
+                telemetry.metrics.inc("haptic_failures_total", device=self.name)
+                telemetry.log("VIBRATION", f"{self.name}: {command[0]} failed: {error}", device=self.name)
+            else:
+                latency = time.monotonic() - started
+                self.metrics.record(latency)
+                self._last_acked = command
+                telemetry.metrics.observe("haptic_ack_seconds", latency, device=self.name)
+                telemetry.tracer.span("device_ack", latency, round_id=round_id, device=self.name,
+                                      command=command[0], value=command[1])
+
+
+# -------------------------------
+# Device fan-out
+# -------------------------------
+def device_name(device):
+    return getattr(device, "name", None) or str(device)
+
+
+async def device_command(device, command, value=None, client=None):
+    """Send one command to every actuator of `device` at once."""
+    if command == "vibrate":
+        actuators = getattr(device, "actuators", None)
+        if actuators:
+            await asyncio.gather(*(actuator.command(value) for actuator in actuators))
+        elif hasattr(device, "send_vibrate_cmd"):
+            await device.send_vibrate_cmd(value)
+        else:
+            raise RuntimeError("device has no vibrate method")
+    elif hasattr(device, "stop"):
+        await device.stop()
+    elif hasattr(device, "send_stop_device_cmd"):
+        await device.send_stop_device_cmd()
+    elif client and hasattr(client, "stop_all"):
+        await client.stop_all()
+    else:
+        raise RuntimeError("device has no stop method")
+
+
+class DeviceFleet:
+    """Drives every connected device, each through its own CommandQueue so a slow device
+    never holds up the others. `get_devices()` returns the client's current device dict;
+    it is checked on every command, so devices that come and go mid-session are picked up
+    (and get the current state) without a restart.
+    `settings` maps a device name, or part of it, to {"scale": 0..1, "timeout": seconds}.
+    `round_id` is handed to every CommandQueue.
+    """
+
+    def __init__(self, loop, get_devices, settings=None, client=None, round_id=None):
+        self.loop = loop
+        self.get_devices = get_devices
+        self.settings = settings or {}
+        self.client = client
+        self.round_id = round_id
+        self.queues = {}        # device index -> (device, CommandQueue)
+        self.on_change = None   # called after devices were added or removed
+        self._last = None
+
+    def _settings_for(self, name):
+        if name in self.settings:
+            return self.settings[name]
+        lowered = name.lower()
+        for key, value in self.settings.items():
+            if key.lower() in lowered:
+                return value
+        return {}
+
+    def _add(self, index, device):
+        name = device_name(device)
+        settings = self._settings_for(name)
+        scale = max(0.0, min(1.0, float(settings.get("scale", 1.0))))
+
+        def send(command, value=None):
+            if command == "vibrate":
+                value = min(1.0, value * scale)
+            return device_command(device, command, value, client=self.client)
+
+        queue = CommandQueue(self.loop, send, name=name,
+                             timeout=float(settings.get("timeout", COMMAND_TIMEOUT)), round_id=self.round_id)
+        self.queues[index] = (device, queue)
+        telemetry.log("VIBRATION", f"Using device: {name}" + (f" (scale {scale:g})" if scale != 1.0 else ""),
+                      device=name)
+        if self._last is not None:
+            queue.put(*self._last)
+
+    def sync(self):
+        """Pick up added and removed devices; must be called on the fleet's loop."""
+        try:
+            devices = dict(self.get_devices())
+        except Exception as e:
+            telemetry.log("VIBRATION", f"Could not list devices: {e}")
+            return
+        changed = False
+        for index in [i for i, (device, _) in self.queues.items() if devices.get(i) is not device]:
+            device, _ = self.queues.pop(index)
+            telemetry.log("VIBRATION", f"Device removed: {device_name(device)}", device=device_name(device))
+            changed = True
+        for index, device in devices.items():
+            if index not in self.queues:
+                self._add(index, device)
+                changed = True
+        if changed and self.on_change:
+            self.on_change()
+
+    def submit(self, command, value=None):
+        """Send `command` to every device, from any thread."""
+        self.loop.call_soon_threadsafe(self._dispatch, command, value)
+
+    def _dispatch(self, command, value):
+        self._last = (command, value)
+        self.sync()
+        if not self.queues:
+            telemetry.log("VIBRATION", f"(simulated) {command}" + (f" {value:.0%}" if value is not None else ""))
+        for _, queue in self.queues.values():
+            queue.put(command, value)
+
+    def stats(self):
+        """Per-device delivery metrics, keyed by device name."""
+        return {queue.name: queue.metrics.snapshot() for _, queue in list(self.queues.values())}
+
+
+# -------------------------------
+# Server connection (event-driven discovery, reconnect)
+# -------------------------------
+class ButtplugLink:
+    """Keeps a Buttplug server connection alive and the fleet in sync with its devices.
+    Reconnects with exponential backoff (plus jitter) whenever the server is missing or
+    the connection drops. Scanning runs until a device shows up; device added/removed
+    messages from the server update the fleet immediately.
+    `state` is one of "connecting", "connected", "reconnecting"; on_state(state, detail)
+    is called from the loop thread on every change.
+    """
+
+    def __init__(self, fleet, make_client, make_connector, url, on_state=None):
+        self.fleet = fleet
+        self.make_client = make_client
+        self.make_connector = make_connector
+        self.url = url
+        self.on_state = on_state
+        self.state = "connecting"
+        self.client = None
+        self._known = set()
+        fleet.get_devices = self.devices
+
+    def devices(self):
+        client = self.client
+        return client.devices if client is not None and client.connected else {}
+
+    def _set_state(self, state, detail=""):
+        self.state = state
+        telemetry.log("VIBRATION", f"Buttplug server {state}" + (f": {detail}" if detail else ""), state=state)
+        if self.on_state:
+            try:
+                self.on_state(state, detail)
+            except Exception as e:
+                telemetry.log("VIBRATION", f"State callback failed: {e}")
+
+    async def run(self):
+        delay = RECONNECT_MIN
+        while True:
+            client = self.make_client()
+            self._watch_devices(client)
+            try:
+                await client.connect(self.make_connector(self.url))
+            except Exception as e:
+                wait = delay * random.uniform(0.8, 1.2)
+                self._set_state("reconnecting", f"{e}, retrying in {wait:.0f}s")
+                await asyncio.sleep(wait)
+                delay = min(RECONNECT_MAX, delay * 2)
+                continue
+
+            delay = RECONNECT_MIN
+            self.client = self.fleet.client = client
+            self._set_state("connected", f"{len(client.devices)} device(s)")
+            self._devices_changed(client)
+            await self._wait_closed(client)
+            self.client = None
+            self._devices_changed(client)
+            self._set_state("reconnecting", "connection lost")
+
+    def _watch_devices(self, client):
+        # The client has no device callbacks, so look at its device list after every
+        # server message instead; DeviceAdded/DeviceRemoved arrive as such messages.
+        handle_message = client._handle_message
+
+        async def _handle_message(message):
+            await handle_message(message)
+            if self.client is client and set(client.devices) != self._known:
+                self._devices_changed(client)
+
+        client._handle_message = _handle_message
+
+    def _devices_changed(self, client):
+        self._known = set(self.devices())
+        self.fleet.sync()
+        if self.client is not client:
+            return
+        # Scan only while there is nothing to drive
+        if self._known:
+            self.fleet.loop.create_task(self._scan(client, False))
+        else:
+            self.fleet.loop.create_task(self._scan(client, True))
+
+    async def _scan(self, client, start):
+        try:
+            if start:
+                await client.start_scanning()
+            else:
+                await client.stop_scanning()
+        except Exception:
+            # Not fatal; some servers may not implement scanning the same way
+            pass
+
+    async def _wait_closed(self, client):
+        connection = getattr(client._connector, "_connection", None)
+        if connection is not None and hasattr(connection, "wait_closed"):
+            await connection.wait_closed()
+            return
+        while client.connected:
+            await asyncio.sleep(1)
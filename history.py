@@ -0,0 +1,327 @@
+"""Round history: an append-only binary log of every finished round.
+
+    python history.py [round_history.bin]     # success rates, reaction times, streaks
+
+The log is a 16 byte header followed by fixed-size 32 byte records. Task and endpoint
+names are stored once in a string table next to it (round_history.names, one name per
+line, the line number is the id). Reading maps the file into memory; with numpy the
+queries run over whole columns at once, without it they fall back to struct.iter_unpack.
+"""
+import math
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+
+from catalog import name_key
+
+# -------------------------------
+# Round history (fixed-size records, string table, mmap queries)
+# -------------------------------
+HISTORY_PATH = "round_history.bin"
+MAGIC = b"SSHIST01"
+HEADER = struct.Struct("<8sII")         # magic, record size, reserved
+# started_at (epoch s), task id, endpoint id, reaction (s, NaN if none), duration (s),
+# success, simon said, first player action
+RECORD = struct.Struct("<dIIffBBB5x")
+NO_ID = 0xFFFFFFFF
+ACTIONS = ("", "window", "open", "nothing")
+FIELDS = ("started_at", "task", "endpoint", "reaction", "duration", "success", "simon", "action")
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def _dtype(np):
+    return np.dtype({
+        "names": list(FIELDS),
+        "formats": ["<f8", "<u4", "<u4", "<f4", "<f4", "u1", "u1", "u1"],
+        "offsets": [0, 8, 12, 16, 20, 24, 25, 26],
+        "itemsize": RECORD.size,
+    })
+
+
+def names_path(path):
+    return os.path.splitext(path)[0] + ".names"
+
+
+def practice_factor(rounds, successes):
+    """Weight multiplier for a task from its record: 1 for an unplayed task, up to 1.5 for
+    one that is always failed and down to 0.5 for one that is always won, so the rounds
+    drift towards what the player gets wrong.
+    """
+    return 0.5 + (rounds - successes + 1) / (rounds + 2)
+
+
+class StringTable:
+    """Append-only list of names (by name_key()); a name's id is its line number in the file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.names = []
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.names = f.read().split("\n")[:-1]
+        self._ids = {name: i for i, name in enumerate(self.names)}
+        self._lock = threading.Lock()
+
+    def id(self, name):
+        name = name_key(name)
+        with self._lock:
+            found = self._ids.get(name)
+            if found is None:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(name + "\n")
+                found = self._ids[name] = len(self.names)
+                self.names.append(name)
+        return found
+
+
+class RoundLog:
+    """Appends one record per round. A record cut short by a crash is dropped on open."""
+
+    def __init__(self, path=HISTORY_PATH):
+        self.path = path
+        self.names = StringTable(names_path(path))
+        self._lock = threading.Lock()
+        self._file = open(path, "a+b")
+        self._file.seek(0)
+        header = self._file.read(HEADER.size)
+        if not header:
+            self._file.write(HEADER.pack(MAGIC, RECORD.size, 0))
+            self._file.flush()
+        elif len(header) < HEADER.size or HEADER.unpack(header)[:2] != (MAGIC, RECORD.size):
+            raise ValueError(f"{path} is not a round history file")
+        size = os.fstat(self._file.fileno()).st_size
+        whole = HEADER.size + (size - HEADER.size) // RECORD.size * RECORD.size
+        if whole != size:
+            self._file.truncate(whole)
+
+    def append(self, task, success, started_at, reaction=None, duration=0.0, simon=False,
+               action="", endpoint=None):
+        record = RECORD.pack(
+            started_at,
+            self.names.id(task),
+            NO_ID if endpoint is None else self.names.id(endpoint),
+            math.nan if reaction is None else reaction,
+            duration,
+            1 if success else 0,
+            1 if simon else 0,
+            ACTIONS.index(action) if action in ACTIONS else 0,
+        )
+        with self._lock:
+            self._file.write(record)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class RoundHistory:
+    """A read-only, memory-mapped view of a round log as of when it was opened."""
+
+    def __init__(self, path=HISTORY_PATH):
+        self.path = path
+        self.names = StringTable(names_path(path)).names
+        self.count = 0
+        self._mm = None
+        self._columns = None
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size <= HEADER.size:
+                return
+            if HEADER.unpack(f.read(HEADER.size))[:2] != (MAGIC, RECORD.size):
+                raise ValueError(f"{path} is not a round history file")
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.count = (size - HEADER.size) // RECORD.size
+
+    def __len__(self):
+        return self.count
+
+    def columns(self):
+        """Field name -> column. numpy arrays (views of the mapping) if numpy is installed,
+        otherwise tuples.
+        """
+        if self._columns is None:
+            np = _numpy()
+            if not self.count:
+                self._columns = {name: () for name in FIELDS}
+            elif np is not None:
+                records = np.frombuffer(self._mm, dtype=_dtype(np), count=self.count, offset=HEADER.size)
+                self._columns = {name: records[name] for name in FIELDS}
+            else:
+                view = memoryview(self._mm)[HEADER.size:HEADER.size + self.count * RECORD.size]
+                self._columns = dict(zip(FIELDS, zip(*RECORD.iter_unpack(view))))
+        return self._columns
+
+    def success_rates(self):
+        """Task name -> (rounds, successes, success rate)."""
+        columns = self.columns()
+        np = _numpy()
+        if np is not None and self.count:
+            rounds = np.bincount(columns["task"], minlength=len(self.names))
+            successes = np.bincount(columns["task"], weights=columns["success"], minlength=len(self.names))
+            played = np.flatnonzero(rounds)
+            return {self.names[i]: (int(rounds[i]), int(successes[i]), float(successes[i] / rounds[i]))
+                    for i in played}
+        counts = {}
+        for task, success in zip(columns["task"], columns["success"]):
+            entry = counts.setdefault(task, [0, 0])
+            entry[0] += 1
+            entry[1] += success
+        return {self.names[i]: (r, s, s / r) for i, (r, s) in counts.items()}
+
+    def reaction_percentiles(self, percentiles=(50, 90, 99), task=None):
+        """Percentiles of the time from pick to the player's first action, in seconds."""
+        columns = self.columns()
+        task_id = None
+        if task is not None:
+            task = name_key(task)
+            if task not in self.names:
+                return {}
+            task_id = self.names.index(task)
+        np = _numpy()
+        if np is not None and self.count:
+            reaction = columns["reaction"]
+            keep = ~np.isnan(reaction)
+            if task_id is not None:
+                keep &= columns["task"] == task_id
+            values = reaction[keep]
+            if not values.size:
+                return {}
+            return dict(zip(percentiles, (float(v) for v in np.percentile(values, percentiles))))
+        values = sorted(r for t, r in zip(columns["task"], columns["reaction"])
+                        if r == r and (task_id is None or t == task_id))
+        if not values:
+            return {}
+        return {p: values[min(len(values) - 1, int(len(values) * p / 100))] for p in percentiles}
+
+    def streaks(self):
+        """{"current": n} (positive for wins in a row, negative for losses), plus the
+        longest winning and losing streaks.
+        """
+        success = self.columns()["success"]
+        if not self.count:
+            return {"current": 0, "longest_win": 0, "longest_loss": 0}
+        np = _numpy()
+        if np is not None:
+            ends = np.append(np.flatnonzero(np.diff(success)), self.count - 1)
+            lengths = np.diff(np.append(-1, ends))
+            wins = success[ends] == 1
+            last = int(lengths[-1])
+            return {
+                "current": last if wins[-1] else -last,
+                "longest_win": int(lengths[wins].max(initial=0)),
+                "longest_loss": int(lengths[~wins].max(initial=0)),
+            }
+        longest = {0: 0, 1: 0}
+        run, previous = 0, None
+        for value in success:
+            run = run + 1 if value == previous else 1
+            previous = value
+            longest[value] = max(longest[value], run)
+        return {"current": run if previous else -run, "longest_win": longest[1], "longest_loss": longest[0]}
+
+    def close(self):
+        self._columns = None
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+
+class HistoryRecorder:
+    """A Game listener that appends a record to `log` at every verdict and keeps per-task
+    rounds/successes in memory. on_factors(factors) gets the practice_factor of every
+    task played so far after each round, for TaskSource.set_factors(). Tasks are counted
+    by name_key(), like the names in the log.
+    """
+
+    def __init__(self, log, clock=time.monotonic, on_factors=None, counts=None):
+        self.log = log
+        self.clock = clock
+        self.on_factors = on_factors
+        self.counts = {}
+        for name, (rounds, successes, *_) in (counts or {}).items():
+            entry = self.counts.setdefault(name_key(name), [0, 0])
+            entry[0] += rounds
+            entry[1] += successes
+        self._round = None
+
+    @classmethod
+    def open(cls, path=HISTORY_PATH, clock=time.monotonic, on_factors=None):
+        """Open the log at `path` for appending, with the counts of every round already in it."""
+        history = RoundHistory(path)
+        try:
+            counts = history.success_rates()
+        finally:
+            history.close()
+        recorder = cls(RoundLog(path), clock, on_factors, counts)
+        recorder._publish()
+        return recorder
+
+    def factors(self):
+        return {name: practice_factor(rounds, successes) for name, (rounds, successes) in self.counts.items()}
+
+    def _publish(self):
+        if self.on_factors and self.counts:
+            self.on_factors(self.factors())
+
+    def __call__(self, event, task=None, **fields):
+        now = self.clock()
+        if event == "pick":
+            self._round = {"task": task, "picked": now, "reaction": None, "action": "", "endpoint": None}
+            return
+        current = self._round
+        if current is None or (task is not None and task is not current["task"]):
+            return
+        if event in ("detect", "action") and current["reaction"] is None:
+            current["reaction"] = now - current["picked"]
+            current["action"] = "window" if event == "detect" else fields.get("action", "")
+        elif event == "verify":
+            current["endpoint"] = fields.get("endpoint")
+        elif event == "verdict":
+            self._round = None
+            task, success = current["task"], bool(fields.get("success"))
+            try:
+                self.log.append(task["name"], success, task.get("started_at", time.time()),
+                                reaction=current["reaction"], duration=now - current["picked"],
+                                simon=task.get("simon"), action=current["action"],
+                                endpoint=current["endpoint"])
+            except (OSError, ValueError) as e:
+                print(f"[HISTORY] Could not record round: {e}")
+            entry = self.counts.setdefault(name_key(task["name"]), [0, 0])
+            entry[0] += 1
+            entry[1] += success
+            self._publish()
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else HISTORY_PATH
+    history = RoundHistory(path)
+    print(f"{len(history)} rounds in {path}")
+    if not len(history):
+        return
+    for name, (rounds, successes, rate) in sorted(history.success_rates().items(), key=lambda i: i[1][2]):
+        print(f"  {name:40} {successes:6}/{rounds:<6} {rate:6.1%}  "
+              f"weight x{practice_factor(rounds, successes):.2f}")
+    reaction = history.reaction_percentiles()
+    if reaction:
+        print("  reaction " + "  ".join(f"p{p} {seconds:.2f}s" for p, seconds in reaction.items()))
+    streaks = history.streaks()
+    print(f"  streak {streaks['current']:+d}, longest win {streaks['longest_win']}, "
+          f"longest loss {streaks['longest_loss']}")
+    history.close()
+
+
+if __name__ == "__main__":
+    main()
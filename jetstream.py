@@ -0,0 +1,208 @@
+import asyncio
+import json
+import random
+import threading
+import time
+from collections import deque
+from urllib.parse import urlencode
+
+import bluesky
+from telemetry import log, metrics
+
+# -------------------------------
+# Push-based post verification (Jetstream event stream)
+# -------------------------------
+JETSTREAM_URL = "wss://jetstream2.us-east.bsky.network/subscribe"
+POST_COLLECTION = "app.bsky.feed.post"
+RING_SIZE = 256             # recent posts kept in memory
+RESUME_REWIND = 5_000_000   # microseconds replayed before the last seen event on reconnect
+RECONNECT_MIN = 1.0         # first reconnect delay, seconds (doubles per failed attempt)
+RECONNECT_MAX = 30.0
+ACCOUNT_RETRY = 30          # seconds between attempts to learn the account DID
+DID_CHECK = 10.0            # seconds between checks that the followed DID is still the account's
+STREAM_GRACE = 3.0          # seconds to wait for a dropped stream to come back before polling
+
+
+class PostStream:
+    """One long-lived Jetstream subscription to the posts of a single DID.
+    New posts go into a ring buffer of the last RING_SIZE posts and wake up every
+    waiter at once. The connection runs on its own thread and is retried with backoff;
+    each reconnect resumes from the last event's cursor (rewound a little, duplicates
+    are dropped), so posts made while disconnected are still delivered.
+    `get_did()` is called (on the stream thread) until it returns the DID to follow, and
+    again every DID_CHECK seconds while connected; when the account moved to a new DID, the
+    buffer is emptied and the stream resubscribes for the new one.
+    """
+
+    def __init__(self, get_did, url=JETSTREAM_URL, size=RING_SIZE):
+        self.get_did = get_did
+        self.url = url
+        self.did = None
+        self.cursor = None
+        self.live = False
+        self.posts = deque(maxlen=size)     # (uri, normalized text, created epoch seconds)
+        self.received = 0                   # posts ever added to the buffer
+        self._uris = set()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._loop = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="jetstream", daemon=True)
+            self._thread.start()
+        return self
+
+    def subscribe_url(self):
+        params = [("wantedCollections", POST_COLLECTION), ("wantedDids", self.did)]
+        if self.cursor:
+            params.append(("cursor", max(0, self.cursor - RESUME_REWIND)))
+        return f"{self.url}?{urlencode(params)}"
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._connect_forever())
+
+    async def _connect_forever(self):
+        import websockets
+
+        while self.did is None:
+            self.did = await self._loop.run_in_executor(None, self.get_did)
+            if self.did is None:
+                await asyncio.sleep(ACCOUNT_RETRY)
+        delay = RECONNECT_MIN
+        while True:
+            did = self.did
+            try:
+                async with websockets.connect(self.subscribe_url(), max_size=2 ** 20) as ws:
+                    self._set_live(True)
+                    delay = RECONNECT_MIN
+                    check = asyncio.ensure_future(self._check_did(ws))
+                    try:
+                        async for raw in ws:
+                            self._on_message(raw)
+                    finally:
+                        check.cancel()
+            except Exception as e:
+                log("BLUESKY", f"Event stream error: {e}")
+            self._set_live(False)
+            if self.did != did:
+                continue
+            wait = delay * random.uniform(0.8, 1.2)
+            log("BLUESKY", f"Event stream disconnected, reconnecting in {wait:.0f}s")
+            await asyncio.sleep(wait)
+            delay = min(RECONNECT_MAX, delay * 2)
+
+    async def _check_did(self, ws):
+        while True:
+            await asyncio.sleep(DID_CHECK)
+            did = await self._loop.run_in_executor(None, self.get_did)
+            if did and did != self.did:
+                log("BLUESKY", f"Account DID changed from {self.did} to {did}, resubscribing")
+                with self._cond:
+                    self.did = did
+                    self.posts.clear()
+                    self._uris.clear()
+                await ws.close()
+                return
+
+    def _set_live(self, live):
+        with self._cond:
+            self.live = live
+            self._cond.notify_all()
+        if live:
+            log("BLUESKY", "Event stream connected" + (f", resuming at {self.cursor}" if self.cursor else ""))
+
+    def _on_message(self, raw):
+        try:
+            event = json.loads(raw)
+        except ValueError:
+            return
+        time_us = event.get("time_us")
+        if isinstance(time_us, int):
+            self.cursor = max(self.cursor or 0, time_us)
+        commit = event.get("commit") or {}
+        if (event.get("kind") != "commit" or event.get("did") != self.did
+                or commit.get("collection") != POST_COLLECTION or commit.get("operation") != "create"):
+            return
+        record = commit.get("record") or {}
+        uri = f"at://{event['did']}/{POST_COLLECTION}/{commit.get('rkey')}"
+        created = bluesky.parse_timestamp(record.get("createdAt"))
+        if created is not None:
+            metrics.observe("stream_lag_seconds", max(0.0, time.time() - created))
+        with self._cond:
+            if uri in self._uris:
+                return
+            if len(self.posts) == self.posts.maxlen:
+                self._uris.discard(self.posts[0][0])
+            self.posts.append((uri, bluesky.normalize_text(record.get("text") or ""), created))
+            self._uris.add(uri)
+            self.received += 1
+            self._cond.notify_all()
+
+    def _find(self, needle, since, last=None):
+        posts = list(self.posts)
+        for uri, text, created in posts if last is None else posts[len(posts) - last:]:
+            if (created is None or created >= since) and needle in text and bluesky.claim_post(uri):
+                return {"post": {"uri": uri}, "endpoint": "jetstream"}
+        return None
+
+    def wait_live(self, timeout):
+        """Wait up to `timeout` seconds for the subscription to be up; returns whether it is."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.live, timeout)
+
+    def wait_for_post(self, post_text, since, deadline, is_active, check_every=0.5):
+        """Return a post containing `post_text` created after `since` (epoch seconds) as
+        soon as one is in the buffer, or None once `deadline` (time.monotonic()) passes,
+        is_active() turns False or the stream goes down. A post that already won an earlier
+        round (see bluesky.claim_post) is never returned again.
+        """
+        needle = bluesky.normalize_text(post_text)
+        since -= bluesky.CLOCK_SKEW
+        with self._cond:
+            item = self._find(needle, since)
+            seen = self.received
+            while item is None and self.live and is_active():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(min(remaining, check_every))
+                # Only the posts that arrived since the last look need checking
+                new = min(self.received - seen, len(self.posts))
+                item = self._find(needle, since, last=new) if new else None
+                seen = self.received
+        return item
+
+
+class StreamVerifier:
+    """What the game expects from the bluesky module, but answered from a PostStream.
+    Posts by the followed DID are matched the moment they arrive. A dropped stream gets
+    STREAM_GRACE seconds to reconnect (posts made meanwhile are replayed from the resume
+    cursor); after that, or for another DID, the feed is polled as before.
+    """
+
+    def __init__(self, stream, fallback=bluesky):
+        self.stream = stream
+        self.fallback = fallback
+
+    def account_did(self, wait=0):
+        return self.fallback.account_did(wait=wait)
+
+    def warm_connections(self):
+        # Only the feed fallback makes requests, and only while the stream is down
+        if not self.stream.live:
+            self.fallback.warm_connections()
+
+    def watch_for_post(self, did, post_text, since, deadline, is_active, **kwargs):
+        while did == self.stream.did and self.stream.wait_live(
+                max(0.0, min(STREAM_GRACE, deadline - time.monotonic()))):
+            item = self.stream.wait_for_post(post_text, since, deadline, is_active)
+            if item is not None or not is_active() or time.monotonic() >= deadline:
+                return item
+        if not is_active() or time.monotonic() >= deadline:
+            return None
+        if did == self.stream.did:
+            log("BLUESKY", "Event stream down, polling the feed instead")
+        return self.fallback.watch_for_post(did, post_text, since, deadline, is_active, **kwargs)
@@ -0,0 +1,64 @@
+import socket
+import threading
+import time
+from urllib.parse import urlparse
+
+from telemetry import metrics
+from waveforms import DEFAULT_CUES, get_waveform, task_cue
+
+# -------------------------------
+# Next-round prefetching (window matcher, DNS/TLS, waveforms)
+# -------------------------------
+DNS_TTL = 300       # seconds before a resolved link host is resolved again
+BLUESKY_PROFILE = "https://bsky.app"    # what Open shows for tasks with bluesky_open
+
+
+class Prefetcher:
+    """Readies the next round's task while the current one is still played
+    (Game(prefetch=...)): its start and penalty waveforms are compiled, the window
+    matcher it will subscribe with is built, the host of its link is resolved and, for
+    post tasks, connections to the Bluesky hosts are opened. Links are opened by the
+    browser, so for them only the system's DNS cache can be warmed.
+    Every step is best effort; whatever was not ready is simply done when the round starts.
+    """
+
+    def __init__(self, windows=None, bluesky=None, resolve=socket.getaddrinfo, clock=time.monotonic):
+        self.windows = windows
+        self.bluesky = bluesky
+        self.resolve = resolve
+        self.clock = clock
+        self._resolved = {}     # host -> clock() when it was last resolved
+        self._lock = threading.Lock()
+
+    def __call__(self, task, current=None):
+        started = time.perf_counter()
+        for cue in DEFAULT_CUES:
+            try:
+                get_waveform(task_cue(task, cue))
+            except ValueError:
+                pass    # reported when the cue is played
+        if self.windows is not None and task.get("window_title"):
+            self.windows.prepare(task["window_title"], replacing=(current or {}).get("window_title"))
+        if task.get("link"):
+            self.resolve_host(task["link"])
+        if task.get("bluesky_open"):
+            self.resolve_host(BLUESKY_PROFILE)
+        if task.get("type") == "bluesky_post":
+            warm = getattr(self.bluesky, "warm_connections", None)
+            if warm is not None:
+                warm()
+        metrics.observe("prefetch_seconds", time.perf_counter() - started)
+
+    def resolve_host(self, url):
+        host = urlparse(url).hostname
+        if not host:
+            return
+        with self._lock:
+            resolved = self._resolved.get(host)
+            if resolved is not None and self.clock() - resolved < DNS_TTL:
+                return
+            self._resolved[host] = self.clock()
+        try:
+            self.resolve(host, 443, type=socket.SOCK_STREAM)
+        except OSError as e:
+            print(f"[PREFETCH] Could not resolve {host}: {e}")
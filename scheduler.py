@@ -0,0 +1,155 @@
+import heapq
+import itertools
+import threading
+import time
+
+# -------------------------------
+# Single-threaded timer scheduler
+# -------------------------------
+
+
+class Timer:
+    """Handle for a scheduled call. cancel() stops it, including every later tick of a countdown."""
+
+    def __init__(self, when, callback):
+        self.when = when
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class Scheduler:
+    """Runs timed callbacks on one background thread, no matter how many are pending.
+    Callbacks must not block; anything slow belongs on its own worker.
+    """
+
+    def __init__(self, name="scheduler", clock=time.monotonic):
+        self.name = name
+        self.clock = clock
+        self._heap = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def call_at(self, when, callback, *args):
+        """Run callback(*args) at `when` (a self.clock() value)."""
+        timer = Timer(when, lambda: callback(*args))
+        self._push(timer)
+        return timer
+
+    def call_later(self, delay, callback, *args):
+        return self.call_at(self.clock() + delay, callback, *args)
+
+    def call_soon(self, callback, *args):
+        return self.call_at(self.clock(), callback, *args)
+
+    def repeat(self, count, interval, on_tick, on_done=None):
+        """Call on_tick(k) for k = 0 .. count-1 at start + k*interval, then on_done() at
+        start + count*interval. A late tick does not push the following ones back; ticks
+        that are already overdue are skipped.
+        """
+        start = self.clock()
+        timer = Timer(start, None)
+        last = [-1]
+
+        def step():
+            if timer.cancelled:
+                return
+            # Never repeat a tick, even if rounding puts us a hair before its slot
+            k = last[0] = max(last[0] + 1, int((self.clock() - start) / interval))
+            if k < count:
+                on_tick(k)
+            if timer.cancelled:
+                return
+            if k >= count:
+                if on_done:
+                    on_done()
+                return
+            timer.when = start + (k + 1) * interval
+            self._push(timer)
+
+        timer.callback = step
+        self._push(timer)
+        return timer
+
+    def countdown(self, seconds, on_tick, on_done=None, interval=1.0):
+        """Call on_tick(remaining) for remaining = seconds .. 1 once per interval, then on_done()."""
+        return self.repeat(seconds, interval, lambda k: on_tick(seconds - k), on_done)
+
+    def _push(self, timer):
+        with self._cond:
+            heapq.heappush(self._heap, (timer.when, next(self._counter), timer))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._heap and self._heap[0][2].cancelled:
+                        heapq.heappop(self._heap)
+                        continue
+                    delay = self._heap[0][0] - self.clock() if self._heap else None
+                    if delay is not None and delay <= 0:
+                        break
+                    self._cond.wait(delay)
+                _, _, timer = heapq.heappop(self._heap)
+            try:
+                timer.callback()
+            except Exception as e:
+                print(f"[SCHEDULER] Timer callback failed: {e}")
+
+
+class TimerGroup:
+    """Timers and cleanups that belong together (e.g. one round) and are cancelled at once."""
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self.cancelled = False
+        self._timers = []
+        self._cleanups = []
+        self._lock = threading.Lock()
+
+    def _track(self, timer):
+        with self._lock:
+            self._timers = [t for t in self._timers if not t.cancelled]
+            self._timers.append(timer)
+            if self.cancelled:
+                timer.cancel()
+        return timer
+
+    def call_later(self, delay, callback, *args):
+        return self._track(self.scheduler.call_later(delay, callback, *args))
+
+    def call_soon(self, callback, *args):
+        return self._track(self.scheduler.call_soon(callback, *args))
+
+    def repeat(self, count, interval, on_tick, on_done=None):
+        return self._track(self.scheduler.repeat(count, interval, on_tick, on_done))
+
+    def countdown(self, seconds, on_tick, on_done=None, interval=1.0):
+        return self._track(self.scheduler.countdown(seconds, on_tick, on_done, interval))
+
+    def add_cleanup(self, callback):
+        """Run `callback` when the group is cancelled (immediately if it already is)."""
+        with self._lock:
+            if not self.cancelled:
+                self._cleanups.append(callback)
+                return
+        callback()
+
+    def cancel(self):
+        with self._lock:
+            if self.cancelled:
+                return
+            self.cancelled = True
+            timers, self._timers = self._timers, []
+            cleanups, self._cleanups = self._cleanups, []
+        for timer in timers:
+            timer.cancel()
+        for callback in cleanups:
+            callback()
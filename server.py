@@ -0,0 +1,420 @@
+"""Multi-session server: many independent Simon Says games on one asyncio loop.
+
+    python server.py [--host 127.0.0.1] [--port 8765] [--tasks tasks.json]
+
+Each websocket connection is one player with its own Game (task state, round timers,
+window watcher and device binding). All sessions share the loop, one timer queue, the
+task catalog, the Bluesky connection pool and one feed poller: however many players
+wait for a post, each account's feed is polled once per interval for all of them.
+
+Messages are JSON objects with a "type". From the client:
+    hello    {"name", "bluesky_account", "buttplug"}  all optional; "buttplug" is a
+             Buttplug server URL for the server to drive this player's devices
+    pick / open / nothing                             the three buttons
+    windows  {"titles": [...]}                        the player's open window titles
+From the server:
+    welcome  {"session"}, show {"text"}, buttons {"state"}, vibrate {"level"} (0-100),
+    open_link {"url"}, copy {"text"}, verdict {"success"}, error {"message"}
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import bluesky
+import telemetry
+from catalog import TaskSource, TASKS_PATH
+from game import Game
+from scheduler import Scheduler, Timer
+from windows import WindowWatcher
+
+# -------------------------------
+# Session engine (one loop, many games)
+# -------------------------------
+DEFAULT_PORT = 8765
+VERIFY_WORKERS = 32     # verifications starting at once; the feed wait itself holds no worker
+FEED_RATE = 20          # Bluesky requests per second, all sessions together
+FEED_WORKERS = 32       # Bluesky requests in flight at once
+FEED_INTERVAL = 1.0     # seconds between polls of one account's feed
+POLL_WORKERS = 8        # account feeds polled at once
+RECENT_POSTS = 64       # posts remembered per polled account
+
+
+class LoopScheduler(Scheduler):
+    """A Scheduler whose timers run as asyncio loop callbacks, so every session's timers
+    share the loop thread instead of a timer thread each. Timers may be scheduled from any
+    thread; its clock is the loop's (time.monotonic).
+    """
+
+    def __init__(self, loop):
+        super().__init__(name="sessions", clock=loop.time)
+        self.loop = loop
+        self._loop_thread = None
+
+    def _push(self, timer):
+        if threading.get_ident() == self._loop_thread:
+            self.loop.call_at(timer.when, self._fire, timer)
+        else:
+            self.loop.call_soon_threadsafe(self.loop.call_at, timer.when, self._fire, timer)
+
+    def bind(self):
+        """Remember the loop thread; must be called on it."""
+        self._loop_thread = threading.get_ident()
+
+    @staticmethod
+    def _fire(timer: Timer):
+        if timer.cancelled:
+            return
+        try:
+            timer.callback()
+        except Exception as e:
+            print(f"[SCHEDULER] Timer callback failed: {e}")
+
+
+class RemoteWindows:
+    """The window titles a client last reported."""
+
+    def __init__(self):
+        self.titles = []
+
+    def get_titles(self):
+        return self.titles
+
+
+class FeedPoller:
+    """Feed watching for every session at once, on the server loop. watch() only registers
+    a waiter (a future) and returns; while an account has waiters, one task fetches its
+    feed every `interval` seconds on a small worker pool and hands every new post to all
+    of them. Posts already fetched are kept per account, so a waiter that arrives later
+    still finds them.
+    """
+
+    def __init__(self, loop, interval=FEED_INTERVAL, workers=POLL_WORKERS):
+        self.loop = loop
+        self.interval = interval
+        self.polls = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="feed-poll")
+        self._feeds = {}        # did -> {"waiters", "seen", "recent", "task"}
+
+    def watch(self, did, post_text, since, deadline, is_active, done):
+        """Call done(item) on the loop once a post containing `post_text`, created after
+        `since`, shows up in the feed of `did`; done(None) once `deadline` (loop clock) has
+        passed or is_active() turned False. May be called from any thread.
+        """
+        self.loop.call_soon_threadsafe(self._add, did, post_text, since, deadline, is_active, done)
+
+    def _add(self, did, post_text, since, deadline, is_active, done):
+        future = self.loop.create_future()
+        waiter = {"needle": bluesky.normalize_text(post_text), "since": since - bluesky.CLOCK_SKEW,
+                  "is_active": is_active, "future": future}
+        timer = self.loop.call_at(deadline, self._settle, waiter, None)
+        future.add_done_callback(lambda f: (timer.cancel(), done(f.result())))
+        feed = self._feeds.get(did)
+        if feed is None:
+            feed = self._feeds[did] = {"waiters": [], "seen": set(), "recent": deque(maxlen=RECENT_POSTS)}
+            feed["task"] = self.loop.create_task(self._poll(did, feed))
+        self._offer(waiter, feed["recent"])
+        if not future.done():
+            feed["waiters"].append(waiter)
+
+    def stop(self):
+        """Stop polling; must be called on the loop. Waiting verifications get no post."""
+        for feed in list(self._feeds.values()):
+            feed["task"].cancel()
+            for waiter in feed["waiters"]:
+                self._settle(waiter, None)
+        self._executor.shutdown(wait=False)
+
+    @staticmethod
+    def _settle(waiter, item):
+        if not waiter["future"].done():
+            waiter["future"].set_result(item)
+
+    @classmethod
+    def _offer(cls, waiter, posts):
+        for uri, created, text, item in posts:
+            if (not waiter["future"].done() and (created is None or created >= waiter["since"])
+                    and waiter["needle"] in text and bluesky.claim_post(uri)):
+                cls._settle(waiter, item)
+
+    async def _poll(self, did, feed):
+        try:
+            while True:
+                for waiter in feed["waiters"]:
+                    if not waiter["is_active"]():
+                        self._settle(waiter, None)
+                feed["waiters"] = [w for w in feed["waiters"] if not w["future"].done()]
+                if not feed["waiters"]:
+                    return
+                since = min(w["since"] for w in feed["waiters"])
+                try:
+                    posts = await self.loop.run_in_executor(self._executor, bluesky.new_posts,
+                                                            did, since, feed["seen"])
+                except Exception as e:
+                    telemetry.log("SERVER", f"Feed poll for {did} failed: {e}")
+                    posts = []
+                self.polls += 1
+                # Oldest first, so the earliest matching post goes to the earliest waiter
+                for post in reversed(posts):
+                    if post[0] not in (p[0] for p in feed["recent"]):
+                        feed["recent"].append(post)
+                for waiter in feed["waiters"]:
+                    self._offer(waiter, reversed(posts))
+                await asyncio.sleep(self.interval)
+        finally:
+            # Nothing awaits between the last check and here, so no waiter is left behind
+            self._feeds.pop(did, None)
+
+
+class SessionBluesky:
+    """The bluesky module for one player: the server's shared feed poller and connection
+    pool, but the player's own account instead of the one in config.json. The account is
+    resolved once, in the background, into `dids` (the server's in-memory handle -> DID
+    map); players' handles never go into the desktop app's did_cache.json.
+    """
+
+    def __init__(self, poller, account=None, dids=None, spawn=None):
+        self.poller = poller
+        self.account = account
+        self.did = None
+        self._resolved = threading.Event()
+        handle = bluesky.extract_handle(account) if account else None
+        if handle and dids is not None and dids.get(handle):
+            self.did = dids[handle]
+        if self.did or not handle or spawn is None:
+            self._resolved.set()
+        else:
+            spawn(self._resolve, handle, dids)
+
+    def _resolve(self, handle, dids):
+        try:
+            self.did = bluesky.get_did_from_handle(handle)
+            if self.did and dids is not None:
+                dids[handle] = self.did
+        finally:
+            self._resolved.set()
+
+    def account_did(self, wait=0):
+        self._resolved.wait(wait)
+        return self.did
+
+    def watch(self, *args):
+        self.poller.watch(*args)
+
+
+class Session:
+    """One connected player. Everything the Game does for the player (label, buttons,
+    vibration, opening links) becomes a message to the client; the client's button
+    presses and window titles come back as messages.
+    """
+
+    def __init__(self, server, ws, session_id):
+        self.server = server
+        self.ws = ws
+        self.id = session_id
+        self.name = session_id
+        self.windows = RemoteWindows()
+        self.fleet = None
+        self._link_task = None
+        self._outbox = asyncio.Queue()
+        self.watcher = WindowWatcher(self.windows.get_titles, scheduler=server.scheduler)
+        self.game = Game(server.scheduler, server.tasks, self.watcher, self.output_level, self,
+                         bluesky=SessionBluesky(server.feeds), actions=self, spawn=server.spawn,
+                         rng=random.Random())
+        self.game.listeners.append(self._on_event)
+        self.tracer = telemetry.RoundTracer(server.scheduler.clock, session=session_id)
+        self.game.listeners.append(self.tracer)
+
+    # --- Outgoing (safe from any thread) ---
+    def send(self, kind, **fields):
+        fields["type"] = kind
+        self.server.loop.call_soon_threadsafe(self._outbox.put_nowait, fields)
+
+    async def _writer(self):
+        while True:
+            message = await self._outbox.get()
+            try:
+                await self.ws.send(json.dumps(message))
+            finally:
+                self._outbox.task_done()
+
+    # Game UI
+    def show(self, text):
+        self.send("show", text=text)
+
+    def set_buttons(self, state):
+        self.send("buttons", state=state)
+
+    # Game actions
+    def open_link(self, url):
+        self.send("open_link", url=url)
+
+    def copy(self, text):
+        self.send("copy", text=text)
+
+    def output_level(self, level):
+        self.send("vibrate", level=level)
+        if self.fleet:
+            if level:
+                self.fleet.submit("vibrate", level / 100.0)
+            else:
+                self.fleet.submit("stop")
+
+    def _on_event(self, event, task=None, **fields):
+        if event == "verdict":
+            self.send("verdict", success=fields.get("success"))
+
+    # --- Incoming ---
+    def handle(self, message):
+        kind = message.get("type")
+        if kind == "pick":
+            if self.game.penalty_playing:
+                raise ValueError("penalty still playing")
+            self.game.pick_task()
+        elif kind == "open":
+            self.game.open_task()
+        elif kind == "nothing":
+            self.game.do_nothing_task()
+        elif kind == "windows":
+            titles = message.get("titles")
+            if not isinstance(titles, list):
+                raise ValueError("titles must be a list")
+            self.windows.titles = [str(t) for t in titles]
+            # Detect right away instead of waiting for the next poll
+            self.watcher.refresh()
+        elif kind == "hello":
+            self.name = str(message.get("name") or self.id)
+            self.game.bluesky = SessionBluesky(self.server.feeds, message.get("bluesky_account"),
+                                               self.server.dids, self.server.spawn)
+            if message.get("buttplug"):
+                self.bind_devices(message["buttplug"], message.get("devices"))
+        else:
+            raise ValueError(f"unknown message type {kind!r}")
+
+    def bind_devices(self, url, settings=None):
+        """Drive this player's devices through their own Buttplug server connection."""
+        from buttplug.client import Client
+        from buttplug.connectors import WebsocketConnector
+        from haptics import ButtplugLink, DeviceFleet
+
+        if self._link_task:
+            self._link_task.cancel()
+        self.fleet = DeviceFleet(self.server.loop, dict, settings=settings,
+                                 round_id=lambda: self.tracer.round_id)
+        link = ButtplugLink(self.fleet, lambda: Client(f"SimonSays {self.name}"), WebsocketConnector, url)
+        self._link_task = self.server.loop.create_task(link.run())
+
+    async def run(self):
+        writer = asyncio.ensure_future(self._writer())
+        self.send("welcome", session=self.id)
+        try:
+            async for raw in self.ws:
+                try:
+                    self.handle(json.loads(raw))
+                except Exception as e:
+                    self.send("error", message=str(e) or type(e).__name__)
+        finally:
+            self.close()
+            # Let the last messages out unless the client is already gone
+            try:
+                await asyncio.wait_for(self._outbox.join(), 1.0)
+            except Exception:
+                pass
+            writer.cancel()
+
+    def close(self):
+        game = self.game
+        game.task_active = False
+        game.round_timers.cancel()
+        game.stop_vibration()
+        if self._link_task:
+            self._link_task.cancel()
+            self._link_task = None
+
+
+class SessionServer:
+    """Accepts websocket clients and runs one Session per connection on a single loop."""
+
+    def __init__(self, tasks, host="127.0.0.1", port=DEFAULT_PORT, loop=None):
+        self.tasks = tasks
+        self.host = host
+        self.port = port
+        self.loop = loop or asyncio.new_event_loop()
+        self.scheduler = LoopScheduler(self.loop)
+        self.sessions = {}
+        self._ids = itertools.count(1)
+        self._executor = ThreadPoolExecutor(max_workers=VERIFY_WORKERS, thread_name_prefix="verify")
+        # The Bluesky limits are sized for one player; here they are shared by every session
+        bluesky.configure_limits(workers=FEED_WORKERS, rate=FEED_RATE)
+        self.feeds = FeedPoller(self.loop)
+        self.dids = {}          # players' handle -> DID, for this process only
+        self._server = None
+
+    def spawn(self, target, *args):
+        """Run blocking work (account lookups, starting a verification) on the shared worker pool."""
+        self._executor.submit(target, *args)
+
+    async def _handle(self, ws, *_):
+        session = Session(self, ws, f"s{next(self._ids)}")
+        self.sessions[session.id] = session
+        telemetry.metrics.inc("sessions_total")
+        print(f"[SERVER] Session {session.id} connected ({len(self.sessions)} active)")
+        try:
+            await session.run()
+        finally:
+            self.sessions.pop(session.id, None)
+            print(f"[SERVER] Session {session.id} closed ({len(self.sessions)} active)")
+
+    async def start(self):
+        import websockets
+
+        self.scheduler.bind()
+        self._server = await websockets.serve(self._handle, self.host, self.port)
+        self.port = next(iter(self._server.sockets)).getsockname()[1]
+        print(f"[SERVER] Listening on ws://{self.host}:{self.port}")
+        return self
+
+    async def stop(self):
+        for session in list(self.sessions.values()):
+            session.close()
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        self.feeds.stop()
+        self._executor.shutdown(wait=False)
+
+    def serve_forever(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self.start())
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.run_until_complete(self.stop())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simon Says multi-session server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--tasks", default=TASKS_PATH, help="tasks file shared by every session")
+    parser.add_argument("--config", default="config.json", help="for the telemetry section")
+    args = parser.parse_args()
+
+    try:
+        with open(args.config, "r") as f:
+            telemetry.configure(json.load(f).get("telemetry"))
+    except (OSError, ValueError):
+        pass
+    server = SessionServer(TaskSource(args.tasks), args.host, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,471 @@
+import asyncio
+import heapq
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from scheduler import Scheduler
+
+# -------------------------------
+# Headless stand-ins for the clock, the window list, the UI and both servers
+# -------------------------------
+
+
+class VirtualScheduler(Scheduler):
+    """A Scheduler on virtual time: no thread and no sleeping, run() jumps from one timer
+    to the next, so hours of rounds replay in a fraction of a second.
+    """
+
+    def __init__(self, start=0.0):
+        self.now = start
+        super().__init__(name="virtual", clock=lambda: self.now)
+
+    def _push(self, timer):
+        with self._cond:
+            heapq.heappush(self._heap, (timer.when, next(self._counter), timer))
+
+    def run(self, until=None, stop=None):
+        """Run timers in order until the clock reaches `until`, stop() returns True, or no
+        timers are left.
+        """
+        while True:
+            with self._cond:
+                while self._heap and self._heap[0][2].cancelled:
+                    heapq.heappop(self._heap)
+                if not self._heap:
+                    return
+                when, _, timer = self._heap[0]
+                if until is not None and when > until:
+                    self.now = until
+                    return
+                heapq.heappop(self._heap)
+            self.now = max(self.now, when)
+            timer.callback()
+            if stop and stop():
+                return
+
+
+class FakeWindows:
+    """A window list that tests open and close by hand."""
+
+    def __init__(self):
+        self.titles = []
+        self.enumerations = 0
+
+    def get_titles(self):
+        self.enumerations += 1
+        return list(self.titles)
+
+    def open(self, title):
+        self.titles.append(title)
+
+    def close(self, title):
+        if title in self.titles:
+            self.titles.remove(title)
+
+
+class XWindowMaker:
+    """Opens real X11 windows (e.g. on Xvfb) and lists them in the root window's
+    _NET_CLIENT_LIST the way an EWMH window manager would. Needs python-xlib.
+    """
+
+    def __init__(self, display_name=None):
+        from Xlib import X, Xatom, display
+
+        self.display = display.Display(display_name)
+        self.screen = self.display.screen()
+        self.windows = {}       # title -> window
+        self._window_atom = Xatom.WINDOW
+        self._input_output = X.InputOutput
+        self._client_list = self.display.intern_atom("_NET_CLIENT_LIST")
+        self._net_wm_name = self.display.intern_atom("_NET_WM_NAME")
+        self._utf8 = self.display.intern_atom("UTF8_STRING")
+
+    def open(self, title):
+        window = self.screen.root.create_window(0, 0, 100, 100, 0, self.screen.root_depth,
+                                                self._input_output)
+        window.change_property(self._net_wm_name, self._utf8, 8, title.encode("utf-8"))
+        self.windows[title] = window
+        self._publish()
+
+    def close(self, title):
+        window = self.windows.pop(title, None)
+        if window is not None:
+            window.destroy()
+            self._publish()
+
+    def _publish(self):
+        self.screen.root.change_property(self._client_list, self._window_atom, 32,
+                                         [w.id for w in self.windows.values()])
+        self.display.flush()
+
+
+class StaticTasks:
+    """A TaskSource stand-in that always returns the same catalog."""
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+
+    def current(self):
+        return self.catalog
+
+
+class VirtualFeed:
+    """A Bluesky stand-in on virtual time: post() makes a post appear `delay` seconds from
+    now, and watch_for_post() checks for it every `interval` seconds. Waiting runs the
+    scheduler up to the next check, as if the worker thread slept while the round went on.
+    """
+
+    def __init__(self, scheduler, interval=3.0, did="did:plc:simonsays"):
+        self.scheduler = scheduler
+        self.interval = interval
+        self.did = did
+        self.posts = []         # (virtual time it appears, text)
+
+    def account_did(self, wait=0):
+        return self.did
+
+    def post(self, text, delay=0.0):
+        self.posts.append((self.scheduler.now + delay, text))
+
+    def watch_for_post(self, did, post_text, since, deadline, is_active):
+        needle = post_text.casefold()
+        while is_active():
+            for i, (when, text) in enumerate(self.posts):
+                if when <= self.scheduler.now and needle in text.casefold():
+                    del self.posts[i]
+                    return {"post": {"text": text}, "endpoint": "virtual"}
+            if self.scheduler.now >= deadline:
+                return None
+            until = min(self.scheduler.now + self.interval, deadline)
+            self.scheduler.run(until=until)
+            self.scheduler.now = max(self.scheduler.now, until)
+        return None
+
+
+class HeadlessUI:
+    """Records what the Tk window would show."""
+
+    def __init__(self):
+        self.text = ""
+        self.buttons = "normal"
+        self.updates = 0
+
+    def show(self, text):
+        self.text = text
+        self.updates += 1
+
+    def set_buttons(self, state):
+        self.buttons = state
+
+
+class NoActions:
+    """Open button side effects that do nothing."""
+
+    def __init__(self):
+        self.opened = []
+        self.copied = []
+
+    def open_link(self, url):
+        self.opened.append(url)
+
+    def copy(self, text):
+        self.copied.append(text)
+
+
+def _serve_in_thread(start, name):
+    """Run an asyncio server on its own loop thread; returns the loop once start() ran."""
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+
+    def _run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(start())
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=_run, name=name, daemon=True).start()
+    ready.wait()
+    return loop
+
+
+# -------------------------------
+# Local Buttplug server (protocol v3 subset)
+# -------------------------------
+class FakeButtplugServer:
+    """A Buttplug websocket server with simulated devices. Every device command is
+    answered with Ok after `ack_delay` seconds and recorded in `commands`.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, ack_delay=0.0):
+        self.host = host
+        self.port = port
+        self.ack_delay = ack_delay
+        self.devices = {}       # index -> (name, actuator count)
+        self.commands = []
+        self.loop = None
+        self._server = None
+        self._clients = set()
+
+    @property
+    def url(self):
+        return f"ws://{self.host}:{self.port}"
+
+    def start(self):
+        import websockets
+
+        async def _start():
+            self._server = await websockets.serve(self._handle, self.host, self.port)
+            self.port = next(iter(self._server.sockets)).getsockname()[1]
+
+        self.loop = _serve_in_thread(_start, "fake-buttplug")
+        return self
+
+    def stop(self):
+        async def _stop():
+            self._server.close()
+            await self._server.wait_closed()
+
+        asyncio.run_coroutine_threadsafe(_stop(), self.loop).result(5)
+
+    @staticmethod
+    def _device_json(index, name, actuators):
+        return {
+            "DeviceName": name,
+            "DeviceIndex": index,
+            "DeviceMessages": {
+                "ScalarCmd": [{"FeatureDescriptor": "", "StepCount": 20, "ActuatorType": "Vibrate"}] * actuators,
+                "StopDeviceCmd": [],
+            },
+        }
+
+    def add_device(self, name="Sim Vibe", actuators=1):
+        """Add a device and announce it to connected clients; returns its index."""
+        index = max(self.devices, default=-1) + 1
+        self.devices[index] = (name, actuators)
+        message = {"DeviceAdded": dict(Id=0, **self._device_json(index, name, actuators))}
+        self._broadcast(message)
+        return index
+
+    def remove_device(self, index):
+        self.devices.pop(index, None)
+        self._broadcast({"DeviceRemoved": {"Id": 0, "DeviceIndex": index}})
+
+    def _broadcast(self, message):
+        if self.loop is None:
+            return
+        data = json.dumps([message])
+        for ws in list(self._clients):
+            asyncio.run_coroutine_threadsafe(ws.send(data), self.loop)
+
+    async def _handle(self, ws, *_):
+        self._clients.add(ws)
+        try:
+            async for raw in ws:
+                for message in json.loads(raw):
+                    for kind, body in message.items():
+                        asyncio.ensure_future(self._answer(ws, kind, body))
+        except Exception:
+            pass
+        finally:
+            self._clients.discard(ws)
+
+    async def _answer(self, ws, kind, body):
+        msg_id = body.get("Id", 0)
+        if kind == "RequestServerInfo":
+            reply = {"ServerInfo": {"Id": msg_id, "ServerName": "Simon Says stand-in",
+                                    "MessageVersion": 3, "MaxPingTime": 0}}
+        elif kind == "RequestDeviceList":
+            reply = {"DeviceList": {"Id": msg_id, "Devices": [
+                self._device_json(i, name, n) for i, (name, n) in self.devices.items()]}}
+        else:
+            if kind in ("ScalarCmd", "StopDeviceCmd", "StopAllDevices", "VibrateCmd"):
+                self.commands.append((time.monotonic(), kind, body))
+                if self.ack_delay:
+                    await asyncio.sleep(self.ack_delay)
+            reply = {"Ok": {"Id": msg_id}}
+        await ws.send(json.dumps([reply]))
+
+
+# -------------------------------
+# Local Bluesky XRPC server
+# -------------------------------
+_rkeys = itertools.count()     # post record keys, unique across servers like real ones
+
+
+class FakeXRPCServer:
+    """Serves resolveHandle and getAuthorFeed for one account from an in-memory post list."""
+
+    def __init__(self, handle="sim.bsky.social", did="did:plc:simonsays", host="127.0.0.1", port=0):
+        self.handle = handle
+        self.did = did
+        self.posts = []         # newest first
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self._httpd.serve_forever, name="fake-xrpc", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def add_post(self, text, created_at=None):
+        created_at = time.time() if created_at is None else created_at
+        stamp = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(created_at)) + f".{int(created_at % 1 * 1000):03d}Z"
+        with self._lock:
+            uri = f"at://{self.did}/app.bsky.feed.post/{next(_rkeys)}"
+            self.posts.insert(0, {"post": {"uri": uri, "record": {"text": text, "createdAt": stamp}}})
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                with server._lock:
+                    server.requests += 1
+                    if url.path.endswith("com.atproto.identity.resolveHandle"):
+                        status, body = (200, {"did": server.did}) if query.get("handle") == server.handle \
+                            else (400, {"error": "InvalidRequest"})
+                    elif url.path.endswith("app.bsky.feed.getAuthorFeed") and query.get("actor") != server.did:
+                        status, body = 400, {"error": "InvalidRequest", "message": "Profile not found"}
+                    elif url.path.endswith("app.bsky.feed.getAuthorFeed"):
+                        start = int(query.get("cursor", 0))
+                        limit = int(query.get("limit", 50))
+                        page = server.posts[start:start + limit]
+                        body = {"feed": page}
+                        if start + limit < len(server.posts):
+                            body["cursor"] = str(start + limit)
+                        status = 200
+                    else:
+                        status, body = 404, {"error": "MethodNotImplemented"}
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+
+# -------------------------------
+# Local Jetstream server
+# -------------------------------
+class FakeJetstreamServer:
+    """A Jetstream-style subscription endpoint. add_post() publishes a post commit to every
+    subscriber whose wantedDids include its author; a `cursor` query parameter replays the
+    stored events from that time_us on. drop_connections() closes every subscription.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.host = host
+        self.port = port
+        self.events = []        # (did, event json), oldest first
+        self.connections = 0
+        self.cursors = []       # cursor of every subscription, None if it had none
+        self.loop = None
+        self._server = None
+        self._clients = {}      # websocket -> wanted DIDs
+        self._last_us = 0
+
+    @property
+    def url(self):
+        return f"ws://{self.host}:{self.port}/subscribe"
+
+    def start(self):
+        import websockets
+
+        async def _start():
+            self._server = await websockets.serve(self._handle, self.host, self.port)
+            self.port = next(iter(self._server.sockets)).getsockname()[1]
+
+        self.loop = _serve_in_thread(_start, "fake-jetstream")
+        return self
+
+    def stop(self):
+        async def _stop():
+            self._server.close()
+            await self._server.wait_closed()
+
+        asyncio.run_coroutine_threadsafe(_stop(), self.loop).result(5)
+
+    def add_post(self, did, text, created_at=None):
+        """Publish a post by `did`; returns its event."""
+        created_at = time.time() if created_at is None else created_at
+        time_us = self._last_us = max(self._last_us + 1, int(time.time() * 1_000_000))
+        stamp = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(created_at)) + f".{int(created_at % 1 * 1000):03d}Z"
+        event = {
+            "did": did, "time_us": time_us, "kind": "commit",
+            "commit": {"rev": f"r{time_us}", "operation": "create", "collection": "app.bsky.feed.post",
+                       "rkey": f"k{time_us}", "cid": f"c{time_us}",
+                       "record": {"$type": "app.bsky.feed.post", "text": text, "createdAt": stamp}},
+        }
+        data = json.dumps(event)
+
+        def _publish():
+            self.events.append((did, event, data))
+            for ws, dids in list(self._clients.items()):
+                if not dids or did in dids:
+                    asyncio.ensure_future(ws.send(data))
+
+        self.loop.call_soon_threadsafe(_publish)
+        return event
+
+    def drop_connections(self):
+        async def _drop():
+            for ws in list(self._clients):
+                await ws.close()
+
+        asyncio.run_coroutine_threadsafe(_drop(), self.loop).result(5)
+
+    async def _handle(self, ws, *_):
+        query = parse_qs(urlparse(ws.request.path).query)
+        dids = set(query.get("wantedDids", []))
+        cursor = int(query["cursor"][0]) if "cursor" in query else None
+        self.connections += 1
+        self.cursors.append(cursor)
+        if cursor is not None:
+            for did, event, data in list(self.events):
+                if event["time_us"] >= cursor and (not dids or did in dids):
+                    await ws.send(data)
+        self._clients[ws] = dids
+        try:
+            await ws.wait_closed()
+        finally:
+            self._clients.pop(ws, None)
+
+
+def headless_game(tasks, windows=None, output=None, bluesky=None, seed=None, interval=1.0):
+    """A Game on virtual time with stand-ins for the window list, UI and Open button.
+    Returns (game, scheduler, windows). The feed watcher runs inline, so pass a `bluesky`
+    stand-in whose watch_for_post() returns right away or advances the virtual clock
+    itself, like VirtualFeed.
+    """
+    import random
+    from game import Game
+    from windows import WindowWatcher
+
+    scheduler = VirtualScheduler()
+    windows = windows or FakeWindows()
+    watcher = WindowWatcher(windows.get_titles, interval=interval, scheduler=scheduler)
+    game = Game(scheduler, tasks, watcher, output or (lambda level: None), HeadlessUI(),
+                bluesky=bluesky, actions=NoActions(), spawn=lambda target, *args: target(*args),
+                wall_clock=scheduler.clock, rng=random.Random(seed))
+    return game, scheduler, windows
@@ -0,0 +1,104 @@
+import builtins
+import importlib
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# -------------------------------
+# Startup profile (--startup-profile)
+# -------------------------------
+TOP_IMPORTS = 3     # slowest imports listed per phase
+
+
+class StartupProfile:
+    """Times the startup phases and the imports each of them triggered.
+    Imports are timed by wrapping __import__ while enabled; only outermost import statements
+    that loaded something new are counted, so the numbers include nested imports.
+    Disabled, phase() and mark() do nothing.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.started = time.perf_counter()
+        self.phases = []        # (name, start offset, duration, [(module, seconds)])
+        self.marks = []         # (name, offset)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._import = None
+        if enabled:
+            self._import = builtins.__import__
+            builtins.__import__ = self._timed_import
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        imports = getattr(self._local, "imports", None)
+        if imports is None or level or getattr(self._local, "depth", 0):
+            return self._import(name, globals, locals, fromlist, level)
+        self._local.depth = 1
+        loaded = len(sys.modules)
+        started = time.perf_counter()
+        try:
+            return self._import(name, globals, locals, fromlist, level)
+        finally:
+            self._local.depth = 0
+            if len(sys.modules) > loaded:
+                label = f"{name} ({', '.join(fromlist)})" if fromlist and fromlist[0] != "*" else name
+                imports.append((label, time.perf_counter() - started))
+
+    @contextmanager
+    def phase(self, name):
+        if not self.enabled:
+            yield
+            return
+        self._local.imports = imports = []
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._local.imports = None
+            with self._lock:
+                self.phases.append((name, started - self.started, time.perf_counter() - started, imports))
+
+    def mark(self, name):
+        if self.enabled:
+            with self._lock:
+                self.marks.append((name, time.perf_counter() - self.started))
+
+    def report(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            phases, marks = list(self.phases), list(self.marks)
+        print("[STARTUP] Startup profile (ms since main.py started):")
+        for name, offset in marks:
+            print(f"[STARTUP]   {name:<24} at {offset * 1000:7.1f}")
+        for name, offset, duration, imports in sorted(phases, key=lambda p: p[1]):
+            spent = sum(seconds for _, seconds in imports)
+            top = ", ".join(f"{module} {seconds * 1000:.1f}"
+                            for module, seconds in sorted(imports, key=lambda i: -i[1])[:TOP_IMPORTS])
+            print(f"[STARTUP]   {name:<24} at {offset * 1000:7.1f}  took {duration * 1000:7.1f}"
+                  f"  imports {spent * 1000:6.1f}" + (f" ({top})" if top else ""))
+
+    def stop(self):
+        """Stop timing imports."""
+        if self._import is not None:
+            builtins.__import__ = self._import
+            self._import = None
+
+
+class LazyModule:
+    """Stands in for a module and imports it on first attribute access."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, attr):
+        module = self._module
+        if module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+                module = self._module
+        return getattr(module, attr)
@@ -0,0 +1,240 @@
+import itertools
+import json
+import threading
+import time
+
+# -------------------------------
+# Tracing and metrics (JSONL trace, Prometheus text endpoint)
+# -------------------------------
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROUND_BUCKETS = (1, 2, 5, 10, 20, 30, 60, 120, 300, 600)
+
+HELP = {
+    "http_request_seconds": "Bluesky XRPC request latency",
+    "window_poll_seconds": "Time to list and match the open windows",
+    "haptic_ack_seconds": "Vibration command latency from submission to device ack",
+    "round_phase_seconds": "Length of each round phase (\"round\" is pick to verdict)",
+    "rounds_total": "Finished rounds",
+    "haptic_failures_total": "Vibration commands that failed or timed out",
+    "sessions_total": "Player sessions accepted by the server",
+    "stream_lag_seconds": "Delay between a post being created and it arriving on the event stream",
+    "prefetch_seconds": "Time spent readying the next round's task in the background",
+}
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count of observed values."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """Histograms and counters by name and labels, rendered in the Prometheus text format."""
+
+    def __init__(self, prefix="simonsays_"):
+        self.prefix = prefix
+        self._histograms = {}   # name -> {labels: Histogram}
+        self._counters = {}     # name -> {labels: value}
+        self._lock = threading.Lock()
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    @staticmethod
+    def _labels(key, extra=()):
+        pairs = list(key) + list(extra)
+        if not pairs:
+            return ""
+        escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+        return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                full = self.prefix + name
+                lines.append(f"# HELP {full} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {full} counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{full}{self._labels(key)} {value:g}")
+            for name, series in sorted(self._histograms.items()):
+                full = self.prefix + name
+                lines.append(f"# HELP {full} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {full} histogram")
+                for key, h in sorted(series.items()):
+                    for bound, count in zip(h.buckets, h.counts):
+                        lines.append(f"{full}_bucket{self._labels(key, [('le', f'{bound:g}')])} {count}")
+                    lines.append(f"{full}_bucket{self._labels(key, [('le', '+Inf')])} {h.count}")
+                    lines.append(f"{full}_sum{self._labels(key)} {h.sum:.6f}")
+                    lines.append(f"{full}_count{self._labels(key)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+
+class Tracer:
+    """Writes timestamped events and spans as JSON lines, tagged with the current round ID.
+    Nothing is written until open() is given a path.
+    """
+
+    def __init__(self):
+        self.round_id = None
+        self._file = None
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._session = f"{int(time.time()):x}"
+
+    def open(self, path):
+        with self._lock:
+            if self._file:
+                self._file.close()
+            self._file = open(path, "a", buffering=1, encoding="utf-8")
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    def new_round(self):
+        """Start a new round and return its ID (unique across runs)."""
+        self.round_id = f"{self._session}-{next(self._ids)}"
+        return self.round_id
+
+    def write(self, kind, name, round_id=None, **fields):
+        if self._file is None:
+            return
+        record = {"ts": round(time.time(), 6), kind: name, "round": round_id or self.round_id}
+        record.update(fields)
+        line = json.dumps(record, default=str)
+        with self._lock:
+            if self._file:
+                self._file.write(line + "\n")
+
+    def event(self, name, **fields):
+        self.write("event", name, **fields)
+
+    def span(self, name, duration, **fields):
+        """Record a finished span of `duration` seconds that ended now."""
+        self.write("span", name, duration=round(duration, 6), **fields)
+
+
+metrics = Metrics()
+tracer = Tracer()
+
+
+def log(tag, message, **fields):
+    """Print a console line as before ("[TAG] message") and record it in the trace."""
+    print(f"[{tag}] {message}" if tag else message)
+    tracer.event("log", tag=tag, message=message, **fields)
+
+
+class RoundTracer:
+    """A Game listener that turns its events into one span per round phase:
+    wait_detect (pick -> window detected), countdown (detect -> countdown done),
+    verify (Bluesky watch), penalty (verdict -> penalty done) and the whole round.
+    Device acks are traced by the haptic queues under the same round ID.
+    `tags` (e.g. session=...) are added to every record.
+    """
+
+    def __init__(self, clock=time.monotonic, tracer=tracer, metrics=metrics, **tags):
+        self.clock = clock
+        self.tracer = tracer
+        self.metrics = metrics
+        self.tags = tags
+        self.round_id = None
+        self._marks = {}
+
+    def _phase(self, phase, since, now, **fields):
+        started = self._marks.get(since)
+        if started is None:
+            return
+        self.tracer.write("span", phase, round_id=self.round_id, duration=round(now - started, 6),
+                          **self.tags, **fields)
+        self.metrics.observe("round_phase_seconds", now - started, buckets=ROUND_BUCKETS, phase=phase)
+
+    def __call__(self, event, task=None, **fields):
+        now = self.clock()
+        if event == "pick":
+            self._marks = {"pick": now}
+            self.round_id = self.tracer.new_round()
+            self.tracer.write("event", "pick", round_id=self.round_id, task=task["name"], type=task.get("type"),
+                              simon=task.get("simon"), duration=task["duration"], **self.tags)
+            return
+        if event == "detect":
+            self._phase("wait_detect", "pick", now, task=task["name"])
+        elif event == "countdown":
+            self._phase("countdown", "detect", now, task=task["name"])
+        elif event == "verify":
+            self._phase("verify", "verify_start", now, found=fields.get("found"))
+        elif event == "verdict":
+            outcome = "success" if fields.get("success") else "fail"
+            self._phase("round", "pick", now, outcome=outcome, task=task and task["name"])
+            self.metrics.inc("rounds_total", outcome=outcome)
+        elif event == "penalty_done":
+            self._phase("penalty", "verdict", now)
+        self._marks[event] = now
+
+
+def serve_metrics(port, host="127.0.0.1", metrics=metrics):
+    """Serve metrics.render() at http://host:port/metrics on a background thread."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            data = metrics.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    httpd = ThreadingHTTPServer((host, port), Handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, name="metrics", daemon=True).start()
+    return httpd
+
+
+def configure(settings):
+    """Apply the config.json "telemetry" section: {"trace": path, "metrics_port": port}."""
+    settings = settings or {}
+    if settings.get("trace"):
+        try:
+            tracer.open(settings["trace"])
+            print(f"[TELEMETRY] Writing trace to {settings['trace']}")
+        except OSError as e:
+            print(f"[TELEMETRY] Cannot open trace {settings['trace']}: {e}")
+    if settings.get("metrics_port"):
+        try:
+            httpd = serve_metrics(int(settings["metrics_port"]), settings.get("metrics_host", "127.0.0.1"))
+            host, port = httpd.server_address[:2]
+            print(f"[TELEMETRY] Metrics at http://{host}:{port}/metrics")
+        except (OSError, ValueError) as e:
+            print(f"[TELEMETRY] Cannot serve metrics on {settings['metrics_port']}: {e}")
@@ -0,0 +1,600 @@
+"""Checks for the game's building blocks and round flow, run on the stand-ins in sim.py.
+
+    python -m pytest -q
+"""
+import asyncio
+import calendar
+import os
+import random
+import threading
+import time
+from collections import Counter
+
+import pytest
+
+import bluesky
+import endpoints
+import jetstream
+from catalog import AliasTable, TaskCatalog
+from haptics import CommandQueue, DeviceFleet
+from history import HistoryRecorder, practice_factor
+from server import FeedPoller, SessionBluesky
+from sim import (FakeJetstreamServer, FakeXRPCServer, StaticTasks, VirtualFeed, VirtualScheduler, XWindowMaker,
+                 headless_game)
+from windows import TitleMatcher, WindowWatcher
+
+
+# -------------------------------
+# Stand-ins (virtual time)
+# -------------------------------
+def test_virtual_scheduler_runs_timers_in_order():
+    scheduler = VirtualScheduler()
+    ran = []
+    for delay in (3, 1, 2):
+        scheduler.call_later(delay, lambda delay=delay: ran.append((delay, scheduler.now)))
+    scheduler.run(until=2.5)
+    assert ran == [(1, 1.0), (2, 2.0)] and scheduler.now == 2.5
+    scheduler.run()
+    assert ran[-1] == (3, 3.0)
+
+
+def test_virtual_feed_verdict_after_countdown():
+    from game import POST_COUNTDOWN
+
+    tasks = StaticTasks(TaskCatalog.from_entries([
+        {"type": "bluesky_post", "name": "Post", "duration": 0, "post_text": "simon says post"},
+    ]))
+    game, scheduler, _ = headless_game(tasks, seed=1)
+    game.bluesky = feed = VirtualFeed(scheduler, interval=3.0)
+    marks = {}
+    game.listeners.append(lambda event, **fields: marks.setdefault(event, (scheduler.now, fields)))
+    game.pick_task()
+    game.current_task["simon"] = True
+    feed.post("Simon says post", delay=POST_COUNTDOWN + 1)
+    game.open_task()
+    scheduler.run(stop=lambda: "verdict" in marks)
+    assert marks["countdown"][0] == POST_COUNTDOWN
+    # Found by the first feed check after the post appeared
+    assert marks["verdict"] == (12.0, {"task": game.current_task, "success": True})
+
+
+# -------------------------------
+# Weighted sampling
+# -------------------------------
+def test_alias_table_draws_by_weight():
+    weights = [1, 2, 3, 4, 0]
+    table = AliasTable(weights)
+    rng = random.Random(1)
+    draws = 200000
+    counts = Counter(table.draw(rng) for _ in range(draws))
+    for i, weight in enumerate(weights):
+        assert counts[i] / draws == pytest.approx(weight / sum(weights), abs=0.01)
+    assert counts[4] == 0
+
+
+def test_alias_table_single_weight():
+    assert {AliasTable([7]).draw(random.Random(2)) for _ in range(100)} == {0}
+
+
+def test_catalog_samples_by_task_weight():
+    catalog = TaskCatalog.from_entries([
+        {"type": "open_link", "name": "Rare", "duration": 5, "link": "https://example.invalid/", "weight": 1},
+        {"type": "open_link", "name": "Common", "duration": 5, "link": "https://example.invalid/", "weight": 3},
+    ])
+    rng = random.Random(3)
+    counts = Counter(catalog.sample(rng=rng).name for _ in range(40000))
+    assert counts["Common"] / 40000 == pytest.approx(0.75, abs=0.02)
+
+
+# -------------------------------
+# Window title matching
+# -------------------------------
+def test_title_matcher_substrings_case_insensitive():
+    matcher = TitleMatcher(["Firefox", "fire", "Notes", "", None])
+    assert matcher.match("mozilla firefox\nterminal") == {"firefox", "fire"}
+    assert matcher.match("notes - untitled") == {"notes"}
+    assert matcher.match("terminal") == set()
+
+
+def test_title_matcher_overlapping_patterns():
+    assert TitleMatcher(["ab", "bc"]).match("abc") == {"ab", "bc"}
+
+
+def test_title_matcher_without_patterns():
+    assert TitleMatcher([]).match("anything") == set()
+
+@pytest.mark.skipif(not os.environ.get("DISPLAY"), reason="needs an X display (run under xvfb-run)")
+def test_x11_provider_sees_windows_come_and_go():
+    pytest.importorskip("Xlib")
+    from x11windows import X11Provider
+
+    maker = XWindowMaker()
+    watcher = WindowWatcher(X11Provider())
+    changes = []
+    seen = threading.Event()
+
+    def on_change(_pattern, present):
+        changes.append(present)
+        seen.set()
+
+    handle = watcher.subscribe("sim window ", on_change)
+    try:
+        maker.open("Sim Window - Browser")
+        assert seen.wait(2.0)
+        assert "Sim Window - Browser" in watcher.provider.titles()
+        seen.clear()
+        maker.close("Sim Window - Browser")
+        assert seen.wait(2.0)
+        assert "Sim Window - Browser" not in watcher.provider.titles()
+    finally:
+        watcher.unsubscribe(handle)
+    assert changes == [True, False]
+
+
+# -------------------------------
+# Haptic command queues
+# -------------------------------
+class _StubDevice:
+    """Records every command sent to it; each one is acked once `acked` is set."""
+
+    def __init__(self):
+        self.sent = []
+        self.acked = asyncio.Event()
+        self.acked.set()
+
+    async def send(self, command, value=None):
+        self.sent.append((command, value))
+        await self.acked.wait()
+
+
+def _run_queue(steps):
+    """Run the coroutine function steps(queue, device) against a CommandQueue on a stub device."""
+    async def main():
+        device = _StubDevice()
+        queue = CommandQueue(asyncio.get_running_loop(), device.send, min_interval=0)
+        await steps(queue, device)
+        await asyncio.sleep(0.01)
+        return queue, device
+
+    return asyncio.run(main())
+
+
+def test_queue_keeps_only_the_latest_command():
+    async def steps(queue, device):
+        for command in ("vibrate", "stop", "vibrate", "stop"):
+            queue.put(command, 0.5 if command == "vibrate" else None)
+
+    queue, device = _run_queue(steps)
+    assert device.sent == [("stop", None)]
+    assert queue.metrics.submitted == 4 and queue.metrics.acked == 1
+
+
+def test_queue_replaces_the_waiting_command_while_one_is_in_flight():
+    async def steps(queue, device):
+        device.acked.clear()
+        queue.put("vibrate", 0.5)
+        await asyncio.sleep(0.01)
+        assert device.sent == [("vibrate", 0.5)]
+        queue.put("vibrate", 0.6)
+        queue.put("vibrate", 0.7)
+        queue.put("stop")
+        device.acked.set()
+
+    _, device = _run_queue(steps)
+    assert device.sent == [("vibrate", 0.5), ("stop", None)]
+
+
+def test_queue_skips_a_command_the_device_already_acked():
+    async def steps(queue, device):
+        queue.put("stop")
+        await asyncio.sleep(0.01)
+        queue.put("stop")
+
+    queue, device = _run_queue(steps)
+    assert device.sent == [("stop", None)]
+    assert queue.metrics.coalesced == 1
+
+
+class _Actuator:
+    def __init__(self):
+        self.values = []
+
+    async def command(self, value):
+        self.values.append(value)
+
+
+class _Device:
+    def __init__(self, name, actuators):
+        self.name = name
+        self.actuators = [_Actuator() for _ in range(actuators)]
+        self.stops = 0
+
+    async def stop(self):
+        self.stops += 1
+
+
+def test_fleet_drives_every_device_and_actuator():
+    devices = {0: _Device("Sim Vibe", 2), 1: _Device("Other Vibe", 1)}
+
+    async def main():
+        fleet = DeviceFleet(asyncio.get_running_loop(), lambda: devices, settings={"other": {"scale": 0.5}})
+        fleet.submit("vibrate", 0.8)
+        await asyncio.sleep(0.01)
+        fleet.submit("stop")
+        await asyncio.sleep(0.1)
+        return fleet
+
+    fleet = asyncio.run(main())
+    assert [a.values for a in devices[0].actuators] == [[0.8], [0.8]]
+    assert devices[1].actuators[0].values == [0.4]
+    assert [d.stops for d in devices.values()] == [1, 1]
+    assert sorted(fleet.stats()) == ["Other Vibe", "Sim Vibe"]
+
+
+# -------------------------------
+# Round history
+# -------------------------------
+def test_history_factors_reach_tasks_with_odd_whitespace(tmp_path):
+    catalog = TaskCatalog.from_entries([
+        {"type": "open_link", "name": " Stretch  break", "duration": 5, "link": "https://example.invalid/"},
+        {"type": "open_link", "name": "Other", "duration": 5, "link": "https://example.invalid/"},
+    ])
+    path = str(tmp_path / "history.bin")
+    recorder = HistoryRecorder.open(path)
+    task = catalog.tasks[0].as_dict()
+    for success in (False, False):
+        recorder("pick", task=task)
+        recorder("verdict", task=task, success=success)
+    recorder.log.close()
+    factor = practice_factor(2, 0)
+    assert recorder.factors() == {"Stretch break": factor}
+    reopened = HistoryRecorder.open(path)
+    reopened.log.close()
+    assert reopened.factors() == {"Stretch break": factor}
+    weights = [t.weight for t in catalog.reweighted(recorder.factors()).tasks]
+    assert weights == [factor, 1.0]
+
+
+# -------------------------------
+# Bluesky lookups
+# -------------------------------
+class _Response:
+    def __init__(self, status_code=503, body=None):
+        self.status_code = status_code
+        self.headers = {}
+        self._body = body
+
+    def json(self):
+        if self._body is None:
+            raise ValueError("no JSON body")
+        return self._body
+
+    def close(self):
+        pass
+
+
+class _Session:
+    """Records the URLs asked and answers each with `respond(url)`."""
+
+    def __init__(self, respond=lambda url: _Response()):
+        self.respond = respond
+        self.urls = []
+
+    def get(self, url, params=None, timeout=None):
+        self.urls.append(url)
+        return self.respond(url)
+
+
+@pytest.fixture
+def scoreboard(tmp_path, monkeypatch):
+    monkeypatch.setattr(endpoints.scoreboard, "path", str(tmp_path / "stats.json"))
+    monkeypatch.setattr(endpoints.scoreboard, "_stats", {})
+    return endpoints.scoreboard
+
+
+def test_feed_lookup_asks_each_endpoint_once(scoreboard, monkeypatch):
+    session = _Session()
+    monkeypatch.setattr(bluesky, "get_session", lambda: session)
+    assert bluesky.fetch_author_feed_try("did:plc:simonsays", deadline=5) is None
+    assert sorted(session.urls) == sorted(bluesky.FEED_CANDIDATES)
+    assert len(set(session.urls)) == len(session.urls)
+
+
+# -------------------------------
+# Post timestamps, claims and verification
+# -------------------------------
+def test_parse_timestamp_utc():
+    expected = calendar.timegm((2024, 5, 1, 12, 34, 56, 0, 0, 0))
+    assert bluesky.parse_timestamp("2024-05-01T12:34:56.789Z") == expected
+    assert bluesky.parse_timestamp("2024-05-01T12:34:56Z") == expected
+
+
+def test_parse_timestamp_offsets():
+    expected = calendar.timegm((2024, 5, 1, 12, 34, 56, 0, 0, 0))
+    assert bluesky.parse_timestamp("2024-05-01T14:34:56.000+02:00") == expected
+    assert bluesky.parse_timestamp("2024-05-01T07:04:56-05:30") == expected
+
+
+@pytest.mark.parametrize("value", [None, "", "2024-05-01", "not a timestamp at all"])
+def test_parse_timestamp_rejects(value):
+    assert bluesky.parse_timestamp(value) is None
+
+
+def test_post_is_claimed_once():
+    uri = "at://did:plc:test/app.bsky.feed.post/claim-once"
+    assert not bluesky.is_claimed(uri)
+    assert bluesky.claim_post(uri)
+    assert bluesky.is_claimed(uri)
+    assert not bluesky.claim_post(uri)
+
+
+def test_stale_watcher_leaves_the_round_alone():
+    tasks = StaticTasks(TaskCatalog.from_entries([
+        {"type": "bluesky_post", "name": "Post", "duration": 0, "post_text": "simon says post"},
+    ]))
+    game, scheduler, _ = headless_game(tasks, seed=1)
+    game.bluesky = VirtualFeed(scheduler)
+    events = []
+    game.listeners.append(lambda event, **fields: events.append(event))
+    game.pick_task()
+    stale = game.current_task
+    game.pick_task()
+    # A worker still watching for the previous round's post
+    game.verify_bluesky_post(stale, scheduler.now + 1)
+    scheduler.run(until=scheduler.now + 5)
+    assert not {"verify_start", "verify", "verdict"} & set(events)
+    assert game.task_active
+
+
+def test_repeated_open_keeps_one_watcher():
+    tasks = StaticTasks(TaskCatalog.from_entries([
+        {"type": "bluesky_post", "name": "Post", "duration": 0, "post_text": "simon says post"},
+    ]))
+    game, scheduler, _ = headless_game(tasks, seed=1)
+    game.bluesky = feed = VirtualFeed(scheduler)
+    watches = []
+    watch = feed.watch_for_post
+    feed.watch_for_post = lambda *args: watches.append(args) or watch(*args)
+    events = []
+    game.listeners.append(lambda event, **fields: events.append((event, scheduler.now, fields)))
+    game.pick_task()
+    game.current_task["simon"] = True
+    feed.post("simon says post", delay=14)
+    # Pressed again while the first watcher is waiting
+    scheduler.call_later(5, game.open_task)
+    game.open_task()
+    scheduler.run(stop=lambda: not game.task_active)
+    assert len(watches) == 1
+    assert [name for name, *_ in events].count("countdown") == 1
+    assert events[-1][0] == "verdict" and events[-1][2]["success"]
+
+
+# -------------------------------
+# Endpoint circuit breaker
+# -------------------------------
+def test_scoreboard_breaker_opens_and_resets(tmp_path):
+    board = endpoints.Scoreboard(str(tmp_path / "stats.json"))
+    good, bad = "https://good.invalid", "https://bad.invalid"
+    board.record(good, 0.1, True)
+    for _ in range(endpoints.FAILURE_THRESHOLD - 1):
+        board.record(bad, 0.1, False)
+    assert board.order([good, bad]) == [good, bad]
+    board.record(bad, 0.1, False)
+    assert board.order([good, bad]) == [good]
+    board.record(bad, 0.1, True)
+    assert bad in board.order([good, bad])
+
+
+def test_scoreboard_all_open_sorted_by_reopening(tmp_path):
+    board = endpoints.Scoreboard(str(tmp_path / "stats.json"))
+    board.record("https://a.invalid", 0.1, False, retry_after=300)
+    board.record("https://b.invalid", 0.1, False, retry_after=10)
+    assert board.order(["https://a.invalid", "https://b.invalid"]) == ["https://b.invalid", "https://a.invalid"]
+
+
+@pytest.mark.parametrize("response, ok", [
+    (_Response(200, {"did": "did:plc:simonsays"}), True),
+    (_Response(400, {"error": "InvalidRequest", "message": "Unable to resolve handle"}), True),
+    (_Response(404, {"error": "MethodNotImplemented"}), False),
+    (_Response(405), False),
+    (_Response(200), False),                   # not JSON
+    (_Response(200, {"unexpected": True}), False),
+    (_Response(200, ["not", "an", "object"]), False),   # parse raises
+])
+def test_fetch_grades_endpoint_by_usable_answer(scoreboard, monkeypatch, response, ok):
+    url = "https://endpoint.invalid/xrpc/com.atproto.identity.resolveHandle"
+    monkeypatch.setattr(bluesky, "get_session", lambda: _Session(lambda _url: response))
+    bluesky._fetch(url, {}, bluesky._parse_did, 1, lambda: False)
+    stats = scoreboard.snapshot()[url]
+    assert (stats["ok"], stats["failed"]) == ((1, 0) if ok else (0, 1))
+
+
+# -------------------------------
+# Handle -> DID cache
+# -------------------------------
+def test_feed_rejecting_cached_did_drops_it(tmp_path, monkeypatch):
+    server = FakeXRPCServer().start()
+    monkeypatch.setattr(bluesky, "FEED_CANDIDATES", [f"{server.base_url}/xrpc/app.bsky.feed.getAuthorFeed"])
+    monkeypatch.setattr(endpoints.scoreboard, "path", str(tmp_path / "stats.json"))
+    monkeypatch.setattr(bluesky, "DID_CACHE_PATH", str(tmp_path / "did_cache.json"))
+    monkeypatch.setattr(bluesky, "_did_cache", {
+        server.handle: {"did": "did:plc:moved", "resolved_at": 0},
+        "other.bsky.social": {"did": "did:plc:other", "resolved_at": 0},
+    })
+    monkeypatch.setattr(bluesky, "_account_handle", server.handle)
+    resolved = []
+    monkeypatch.setattr(bluesky, "resolve_did", lambda handle: resolved.append(handle))
+    try:
+        assert bluesky.fetch_author_feed_try("did:plc:moved", deadline=2) is None
+    finally:
+        server.stop()
+    bluesky._account_ready.wait(2)
+    assert bluesky.cached_did(server.handle, max_age=None) is None
+    assert bluesky.cached_did("other.bsky.social", max_age=None) == "did:plc:other"
+    assert resolved == [server.handle]
+
+
+# -------------------------------
+# Event stream
+# -------------------------------
+def test_stream_follows_the_account_to_a_new_did(monkeypatch):
+    monkeypatch.setattr(jetstream, "DID_CHECK", 0.05)
+    server = FakeJetstreamServer().start()
+    dids = ["did:plc:old"]
+    stream = jetstream.PostStream(lambda: dids[-1], url=server.url).start()
+    try:
+        assert stream.wait_live(5)
+        dids.append("did:plc:new")
+        deadline = time.monotonic() + 5
+        while not (server.connections == 2 and stream.live) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert stream.did == "did:plc:new" and stream.live
+        since = time.time()
+        server.add_post("did:plc:old", "simon says wave")
+        server.add_post("did:plc:new", "simon says jump")
+        item = stream.wait_for_post("Simon says jump", since, time.monotonic() + 5, lambda: True)
+        assert item["post"]["uri"].startswith("at://did:plc:new/")
+        assert stream.wait_for_post("Simon says wave", since, time.monotonic() + 0.2, lambda: True) is None
+    finally:
+        server.stop()
+
+
+# -------------------------------
+# Session server
+# -------------------------------
+def test_feed_poller_settles_every_waiter_on_the_loop(scoreboard, monkeypatch):
+    xrpc = FakeXRPCServer().start()
+    monkeypatch.setattr(bluesky, "FEED_CANDIDATES", [f"{xrpc.base_url}/xrpc/app.bsky.feed.getAuthorFeed"])
+    loop = asyncio.new_event_loop()
+    poller = FeedPoller(loop, interval=0.05)
+    results = {}
+
+    async def watch_all():
+        settled = asyncio.Event()
+        deadline = loop.time() + 5
+
+        def done(name):
+            def _done(item):
+                results[name] = (item, threading.current_thread())
+                if len(results) == 3:
+                    settled.set()
+            return _done
+
+        since = time.time()
+        xrpc.add_post("simon says first")
+        xrpc.add_post("simon says second")
+        poller.watch(xrpc.did, "Simon says first", since, deadline, lambda: True, done("first"))
+        poller.watch(xrpc.did, "Simon says second", since, deadline, lambda: True, done("second"))
+        poller.watch(xrpc.did, "Simon says third", since, deadline, lambda: False, done("third"))
+        await asyncio.wait_for(settled.wait(), 5)
+
+    try:
+        loop.run_until_complete(watch_all())
+    finally:
+        poller.stop()
+        loop.run_until_complete(asyncio.sleep(0))
+        loop.close()
+        xrpc.stop()
+    assert results["first"][0]["post"]["record"]["text"] == "simon says first"
+    assert results["second"][0]["post"]["record"]["text"] == "simon says second"
+    assert results["third"][0] is None
+    assert {thread for _, thread in results.values()} == {threading.current_thread()}
+    assert poller.polls == 1
+
+
+def test_session_account_stays_out_of_did_cache(monkeypatch):
+    monkeypatch.setattr(bluesky, "get_did_from_handle", lambda handle: f"did:plc:{handle.split('.')[0]}")
+    monkeypatch.setattr(bluesky, "resolve_did", lambda handle: pytest.fail("wrote the DID cache"))
+    monkeypatch.setattr(bluesky, "_save_did_cache", lambda: pytest.fail("wrote the DID cache"))
+    dids = {}
+    spawned = []
+    session = SessionBluesky(None, "@player.bsky.social", dids, lambda target, *args: spawned.append(target(*args)))
+    assert session.account_did() == "did:plc:player"
+    assert dids == {"player.bsky.social": "did:plc:player"}
+    # A second session with the same account needs no lookup
+    again = SessionBluesky(None, "player.bsky.social", dids, lambda target, *args: pytest.fail("looked up again"))
+    assert again.account_did() == "did:plc:player"
+    assert len(spawned) == 1
+
+
+# -------------------------------
+# Penalty and round sequence (virtual time)
+# -------------------------------
+def _game(seed=1):
+    tasks = StaticTasks(TaskCatalog.from_entries([
+        {"type": "open_link", "name": f"Task {i}", "duration": 5, "link": f"https://example.invalid/{i}",
+         "window_title": f"Sim Window {i}"}
+        for i in range(5)
+    ]))
+    game, scheduler, windows = headless_game(tasks, seed=seed)
+    events = []
+    game.listeners.append(lambda event, **fields: events.append((event, scheduler.now)))
+    return game, scheduler, windows, events
+
+
+def _picks(events):
+    return [when for name, when in events if name == "pick"]
+
+
+def _lose(game):
+    """Press the wrong button for the current task."""
+    if game.current_task["simon"]:
+        game.do_nothing_task()
+    else:
+        game.open_task()
+
+
+def _win(game, scheduler, windows):
+    """Play the current task right and run until its verdict."""
+    task = game.current_task
+    if task["simon"]:
+        windows.open(task["window_title"])
+        game.open_task()
+        scheduler.run(stop=lambda: not game.task_active)
+        windows.close(task["window_title"])
+    else:
+        game.do_nothing_task()
+    assert not game.penalty_playing
+
+
+def test_penalty_plays_out_before_next_pick():
+    game, scheduler, _, events = _game()
+    game.pick_task()
+    task = game.current_task
+    _lose(game)
+    assert game.penalty_playing and game.ui.buttons == "disabled"
+
+    game.pick_task()
+    assert game.current_task is task and not game.task_active
+
+    scheduler.run(stop=lambda: not game.penalty_playing)
+    assert game.ui.buttons == "normal"
+    assert len(_picks(events)) == 1
+    assert events[-1][0] == "penalty_done"
+
+
+def test_sequence_waits_for_penalty():
+    game, scheduler, _, events = _game()
+    game.pick_task()
+    _lose(game)
+    game.start_sequence(gap=2)
+    assert len(_picks(events)) == 1
+
+    scheduler.run(stop=lambda: len(_picks(events)) == 2)
+    penalty_done = next(when for name, when in events if name == "penalty_done")
+    assert _picks(events)[1] == pytest.approx(penalty_done + 2)
+
+
+def test_sequence_follows_wins_and_stops():
+    game, scheduler, windows, events = _game()
+    game.start_sequence(gap=2)
+    assert game.task_active
+    _win(game, scheduler, windows)
+    verdict = scheduler.now
+    scheduler.run(stop=lambda: len(_picks(events)) == 2)
+    assert scheduler.now == pytest.approx(verdict + 2)
+
+    game.stop_sequence()
+    _win(game, scheduler, windows)
+    scheduler.run(until=scheduler.now + 60)
+    assert len(_picks(events)) == 2
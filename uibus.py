@@ -0,0 +1,55 @@
+import threading
+
+# -------------------------------
+# UI update bus (any thread -> Tk main loop)
+# -------------------------------
+UI_INTERVAL = 33    # ms between drains of pending widget updates
+
+
+class UIBus:
+    """Hands widget updates from any thread to the Tk main loop.
+    post(key, apply, *args) records the newest update for `key` (one key per widget or
+    group of widgets); every `interval` ms the Tk loop applies everything pending in one
+    go. A widget changed several times between two drains is updated once, and updates
+    posted together (e.g. a new label and the button state) show up in the same frame.
+    """
+
+    def __init__(self, root, interval=UI_INTERVAL):
+        self.root = root
+        self.interval = interval
+        self.applied = 0
+        self.coalesced = 0
+        self._pending = {}      # key -> (apply, args), oldest key first
+        self._lock = threading.Lock()
+        self._after_id = None
+
+    def post(self, key, apply, *args):
+        """Queue apply(*args) for the next drain, replacing an update to the same key."""
+        with self._lock:
+            if key in self._pending:
+                self.coalesced += 1
+            self._pending[key] = (apply, args)
+
+    def start(self):
+        if self._after_id is None:
+            self._after_id = self.root.after(self.interval, self._drain)
+
+    def stop(self):
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+
+    def drain(self):
+        """Apply all pending updates now; must be called on the Tk thread."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for key, (apply, args) in pending.items():
+            try:
+                apply(*args)
+            except Exception as e:
+                print(f"[UI] Update of {key} failed: {e}")
+        self.applied += len(pending)
+
+    def _drain(self):
+        self.drain()
+        self._after_id = self.root.after(self.interval, self._drain)
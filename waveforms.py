@@ -0,0 +1,111 @@
+import json
+import math
+import threading
+
+# -------------------------------
+# Vibration waveforms (compiled once, streamed on the scheduler)
+# -------------------------------
+SAMPLE_RATE = 10        # samples per second
+
+# Built-in patterns, referenced by name from tasks.json.
+# A pattern is one segment or a list of segments; levels are 0-100 and durations seconds.
+PATTERNS = {
+    "pick": {"shape": "steady", "level": 30},
+    "tease": [
+        {"shape": "ramp", "from": 10, "to": 40, "duration": 2},
+        {"shape": "pulse", "low": 20, "high": 40, "period": 1, "duration": 3},
+        {"shape": "steady", "level": 30},
+    ],
+    "penalty": {"shape": "steady", "level": 100, "duration": 10},
+    "escalate": [
+        {"shape": "escalate", "from": 40, "to": 100, "steps": 4, "duration": 6},
+        {"shape": "pulse", "low": 60, "high": 100, "period": 0.5, "duration": 4},
+    ],
+}
+
+DEFAULT_CUES = {"start": "pick", "penalty": "penalty"}
+
+
+def _steady(seg, n):
+    return [seg["level"]] * max(1, n)
+
+
+def _ramp(seg, n):
+    start, end = seg["from"], seg["to"]
+    if n <= 1:
+        return [end]
+    return [start + (end - start) * i / (n - 1) for i in range(n)]
+
+
+def _pulse(seg, n):
+    period = max(1, round(seg.get("period", 1) * SAMPLE_RATE))
+    on = max(1, round(period * seg.get("duty", 0.5)))
+    return [seg["high"] if i % period < on else seg["low"] for i in range(n)]
+
+
+def _escalate(seg, n):
+    steps = max(1, int(seg.get("steps", 4)))
+    start, end = seg["from"], seg["to"]
+    step_len = max(1, math.ceil(n / steps))
+    return [start + (end - start) * min(steps - 1, i // step_len) / max(1, steps - 1) for i in range(n)]
+
+
+SHAPES = {"steady": _steady, "ramp": _ramp, "pulse": _pulse, "escalate": _escalate}
+
+
+def compile_waveform(spec):
+    """Turn a pattern name or spec into a bytes object of 0-100 levels, one per sample.
+    Raises ValueError for unknown patterns or shapes.
+    """
+    if isinstance(spec, str):
+        if spec not in PATTERNS:
+            raise ValueError(f"unknown waveform '{spec}'")
+        spec = PATTERNS[spec]
+    segments = spec if isinstance(spec, list) else [spec]
+    samples = []
+    for seg in segments:
+        shape = SHAPES.get(seg.get("shape"))
+        if shape is None:
+            raise ValueError(f"unknown waveform shape '{seg.get('shape')}'")
+        n = round(seg.get("duration", 0) * SAMPLE_RATE)
+        samples.extend(shape(seg, n))
+    if not samples:
+        raise ValueError("empty waveform")
+    return bytes(max(0, min(100, int(round(level)))) for level in samples)
+
+
+_compiled = {}
+_compiled_lock = threading.Lock()
+
+
+def get_waveform(spec):
+    """compile_waveform() with a cache, so replaying a pattern costs nothing."""
+    key = spec if isinstance(spec, str) else json.dumps(spec, sort_keys=True)
+    with _compiled_lock:
+        samples = _compiled.get(key)
+    if samples is None:
+        samples = compile_waveform(spec)
+        with _compiled_lock:
+            _compiled[key] = samples
+    return samples
+
+
+def task_cue(task, cue):
+    """The waveform spec a task uses for `cue` ("start", "penalty"), or the default."""
+    return (task or {}).get("waveforms", {}).get(cue, DEFAULT_CUES[cue])
+
+
+def play(scheduler, samples, output, on_done=None):
+    """Stream `samples` to output(level) at SAMPLE_RATE on the scheduler.
+    Samples equal to the previous one are not sent again. Returns the timer; cancel() it
+    to stop playback. The last level stays on when playback ends.
+    """
+    last = [None]
+
+    def tick(k):
+        level = samples[k]
+        if level != last[0]:
+            last[0] = level
+            output(level)
+
+    return scheduler.repeat(len(samples), 1.0 / SAMPLE_RATE, tick, on_done)
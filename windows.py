@@ -0,0 +1,218 @@
+import importlib.util
+import os
+import re
+import sys
+import threading
+import time
+
+from telemetry import metrics
+
+# -------------------------------
+# Window title snapshots (one enumeration per tick, shared by everyone)
+# -------------------------------
+POLL_INTERVAL = 1.0     # seconds between title snapshots
+
+
+class TitleMatcher:
+    """Match many `window_title` patterns (case-insensitive substrings) against a set of
+    window titles in a single regex pass.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = sorted({p.lower() for p in patterns if p}, key=len, reverse=True)
+        # Longest alternative first, so at every position the regex reports the longest
+        # pattern that matches there; shorter patterns contained in it are implied.
+        self._implied = {p: [q for q in self.patterns if q in p] for p in self.patterns}
+        if self.patterns:
+            alternatives = "|".join(re.escape(p) for p in self.patterns)
+            self._regex = re.compile(f"(?=({alternatives}))")
+        else:
+            self._regex = None
+
+    def match(self, text):
+        """Return the set of patterns found in `text` (lowercased titles joined by newlines)."""
+        found = set()
+        if self._regex is None:
+            return found
+        for m in self._regex.finditer(text):
+            hit = m.group(1)
+            if hit not in found:
+                found.update(self._implied[hit])
+        return found
+
+
+class WindowProvider:
+    """Where window titles come from. titles() lists the open windows' titles.
+    A provider that reports changes itself sets `push` and calls the `on_change` given to
+    watch() after every change; the watcher then never polls it.
+    """
+    push = False
+
+    def titles(self):
+        raise NotImplementedError
+
+    def watch(self, on_change):
+        pass
+
+
+class PollingProvider(WindowProvider):
+    """Titles from a function that enumerates the windows on every call (pygetwindow)."""
+
+    def __init__(self, get_titles):
+        self.get_titles = get_titles
+
+    def titles(self):
+        return self.get_titles()
+
+
+def default_provider(get_titles):
+    """The X11 event provider on a Linux desktop with python-xlib, otherwise polling `get_titles`."""
+    if sys.platform.startswith("linux") and os.environ.get("DISPLAY") and importlib.util.find_spec("Xlib"):
+        from x11windows import X11Provider
+        return X11Provider()
+    return PollingProvider(get_titles)
+
+
+class WindowWatcher:
+    """Shares one window title snapshot between all callers.
+    `subscribe(pattern, callback)` calls callback(pattern, present) on a background thread
+    whenever a window matching the pattern appears or disappears. `is_open(pattern)`
+    answers from the latest snapshot and only enumerates windows if it is older than
+    `interval`, so any number of concurrent checks cost one OS enumeration per tick.
+    `provider` is a WindowProvider, or a function returning the titles (polled).
+    Polling runs on its own thread, or on `scheduler` if one is given (its clock is then
+    used for the snapshot age as well). Push providers are never polled: every change
+    they report is matched right away.
+    prepare(pattern) compiles the matcher a later subscribe() will need in advance.
+    """
+
+    def __init__(self, provider, interval=POLL_INTERVAL, scheduler=None):
+        self.provider = provider if isinstance(provider, WindowProvider) else PollingProvider(provider)
+        self.interval = interval
+        self.scheduler = scheduler
+        self.clock = scheduler.clock if scheduler else time.monotonic
+        self._lock = threading.Lock()
+        self._subscribers = {}      # pattern -> list of callbacks
+        self._matcher = TitleMatcher([])
+        self._prepared = None       # (patterns, TitleMatcher) compiled by prepare()
+        self._text = ""
+        self._present = set()
+        self._taken_at = None
+        self._poller = None
+        self._watching = False
+        self._wakeup = threading.Event()
+
+    def subscribe(self, pattern, callback):
+        """Watch `pattern`; returns a handle for unsubscribe()."""
+        pattern = pattern.lower()
+        self._watch_provider()
+        with self._lock:
+            self._subscribers.setdefault(pattern, []).append(callback)
+            self._matcher = self._matcher_for(self._subscribers)
+            if self._taken_at is not None and pattern in self._matcher.match(self._text):
+                self._present.add(pattern)
+            if self.provider.push:
+                return pattern, callback
+            if self._poller is None:
+                if self.scheduler:
+                    self._poller = self.scheduler.call_soon(self._poll)
+                else:
+                    self._poller = threading.Thread(target=self._run, name="window-watcher", daemon=True)
+                    self._poller.start()
+        if not self.scheduler:
+            self._wakeup.set()
+        return pattern, callback
+
+    def unsubscribe(self, handle):
+        pattern, callback = handle
+        with self._lock:
+            callbacks = self._subscribers.get(pattern, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+            if not callbacks:
+                self._subscribers.pop(pattern, None)
+                self._present.discard(pattern)
+                self._matcher = self._matcher_for(self._subscribers)
+
+    def prepare(self, pattern, replacing=None):
+        """Compile the matcher for the subscriptions as they will be once `replacing` is
+        unsubscribed and `pattern` subscribed, so that subscribe() does not have to.
+        """
+        with self._lock:
+            patterns = set(self._subscribers)
+        patterns.discard((replacing or "").lower())
+        patterns.add(pattern.lower())
+        matcher = TitleMatcher(patterns)
+        with self._lock:
+            self._prepared = (frozenset(patterns), matcher)
+
+    def _matcher_for(self, patterns):
+        if self._prepared is not None and self._prepared[0] == patterns.keys():
+            return self._prepared[1]
+        return TitleMatcher(patterns)
+
+    def is_open(self, pattern):
+        """Return True if a window title contains `pattern` (case-insensitive)."""
+        pattern = pattern.lower()
+        if self.provider.push:
+            self._watch_provider()
+            # Kept current by the provider's events; only the first snapshot is taken here
+            self.refresh(max_age=float("inf"))
+        else:
+            self.refresh(max_age=self.interval)
+        with self._lock:
+            if pattern in self._subscribers:
+                return pattern in self._present
+            return pattern in self._text
+
+    def refresh(self, max_age=0.0):
+        """Take a new snapshot unless the current one is younger than `max_age` seconds,
+        and notify subscribers of every pattern that appeared or disappeared.
+        """
+        with self._lock:
+            if self._taken_at is not None and self.clock() - self._taken_at < max_age:
+                return
+            started = time.perf_counter()
+            try:
+                titles = self.provider.titles()
+            except Exception as e:
+                print(f"[WINDOWS] Could not list windows: {e}")
+                titles = []
+            self._text = "\n".join(t.lower() for t in titles if t)
+            self._taken_at = self.clock()
+            present = self._matcher.match(self._text)
+            metrics.observe("window_poll_seconds", time.perf_counter() - started)
+            changes = [(p, True) for p in present - self._present]
+            changes += [(p, False) for p in self._present - present]
+            self._present = present
+            events = [(cb, p, state) for p, state in changes for cb in list(self._subscribers.get(p, ()))]
+        for callback, pattern, state in events:
+            try:
+                callback(pattern, state)
+            except Exception as e:
+                print(f"[WINDOWS] Subscriber for '{pattern}' failed: {e}")
+
+    def _watch_provider(self):
+        with self._lock:
+            if self._watching or not self.provider.push:
+                return
+            self._watching = True
+        self.provider.watch(self.refresh)
+
+    def _poll(self):
+        with self._lock:
+            if not self._subscribers:
+                self._poller = None
+                return
+            self._poller = self.scheduler.call_later(self.interval, self._poll)
+        self.refresh(max_age=self.interval)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    self._poller = None
+                    return
+            self.refresh(max_age=self.interval)
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
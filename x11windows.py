@@ -0,0 +1,127 @@
+import threading
+
+from windows import WindowProvider
+
+# -------------------------------
+# Linux window titles from X11/EWMH property events (no polling)
+# -------------------------------
+
+
+class X11Provider(WindowProvider):
+    """Keeps an index of top-level window titles from X11 PropertyNotify events.
+    The root window's _NET_CLIENT_LIST (maintained by any EWMH window manager) says which
+    windows exist; each of them is watched for _NET_WM_NAME/WM_NAME changes. Only the
+    window that changed is read again, and on_change() is called after every change, so
+    a window is seen within milliseconds of appearing, however briefly it stays open.
+    Needs python-xlib; the X connection is opened by watch() on the provider's own thread.
+    """
+    push = True
+
+    def __init__(self, display_name=None):
+        self.display_name = display_name
+        self.index = {}         # window id -> title
+        self.error = None
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._thread = None
+
+    def titles(self):
+        self._ready.wait(2.0)
+        if self.error:
+            raise RuntimeError(self.error)
+        with self._lock:
+            return list(self.index.values())
+
+    def watch(self, on_change):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, args=(on_change,), name="x11-windows",
+                                            daemon=True)
+            self._thread.start()
+
+    def _run(self, on_change):
+        try:
+            from Xlib import X, display, error
+            self._display = display.Display(self.display_name)
+        except Exception as e:
+            self.error = f"X11 window events unavailable: {e}"
+            print(f"[WINDOWS] {self.error}")
+            self._ready.set()
+            return
+        d = self._display
+        # Windows can vanish between an event and our request; those errors are expected
+        d.set_error_handler(lambda *args: None)
+        self._X, self._errors = X, (error.BadWindow, error.BadDrawable, error.BadMatch)
+        self._client_list = d.intern_atom("_NET_CLIENT_LIST")
+        self._net_wm_name = d.intern_atom("_NET_WM_NAME")
+        self._utf8 = d.intern_atom("UTF8_STRING")
+        self._wm_name = d.intern_atom("WM_NAME")
+        self._root = d.screen().root
+        self._root.change_attributes(event_mask=X.PropertyChangeMask)
+        self._sync_clients()
+        self._ready.set()
+        on_change()
+
+        while True:
+            event = d.next_event()
+            if event.type != X.PropertyNotify:
+                continue
+            if event.window.id == self._root.id:
+                changed = event.atom == self._client_list and self._sync_clients()
+            elif event.atom in (self._net_wm_name, self._wm_name):
+                changed = self._update_title(event.window)
+            else:
+                changed = False
+            if changed:
+                try:
+                    on_change()
+                except Exception as e:
+                    print(f"[WINDOWS] Window change handler failed: {e}")
+
+    def _sync_clients(self):
+        """Diff _NET_CLIENT_LIST against the index; returns True if a window came or went."""
+        try:
+            prop = self._root.get_full_property(self._client_list, self._X.AnyPropertyType)
+        except self._errors:
+            prop = None
+        current = set(prop.value) if prop is not None else set()
+        with self._lock:
+            known = set(self.index)
+        gone = known - current
+        added = current - known
+        if gone:
+            with self._lock:
+                for wid in gone:
+                    self.index.pop(wid, None)
+        for wid in added:
+            window = self._display.create_resource_object("window", wid)
+            # Subscribe before reading, so a title set in between is not missed
+            window.change_attributes(event_mask=self._X.PropertyChangeMask)
+            with self._lock:
+                self.index[wid] = ""
+            self._update_title(window)
+        return bool(gone or added)
+
+    def _update_title(self, window):
+        wid = window.id
+        with self._lock:
+            if wid not in self.index:
+                return False
+        title = self._read_title(window)
+        with self._lock:
+            if wid not in self.index or self.index[wid] == title:
+                return False
+            self.index[wid] = title
+        return True
+
+    def _read_title(self, window):
+        try:
+            prop = window.get_full_property(self._net_wm_name, self._utf8)
+            if prop is not None and prop.value:
+                value = prop.value
+                return value.decode("utf-8", "replace") if isinstance(value, bytes) else str(value)
+            name = window.get_wm_name()
+        except self._errors:
+            return ""
+        if isinstance(name, bytes):
+            return name.decode("latin-1")
+        return name or ""